@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+from json_backend import JSONDecodeError, load, dump
+
+CACHE_DIR = './analysis_cache/'
+CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+FILE_HASHES_JSON = 'file_hashes.json'
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def write_json_atomically(json_path, data):
+    """"""
+    # Written to a temporary file first, so that concurrent readers never see a partially written file
+    temporary_path = f'{json_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as json_file:
+        dump(data, json_file)
+    os.replace(temporary_path, json_path)
+
+
+def load_cache_index(index_name, cache_dir=CACHE_DIR):
+    """"""
+    try:
+        with open(os.path.join(os.path.abspath(cache_dir), index_name), 'rb') as json_file:
+            return load(json_file)
+    except (FileNotFoundError, JSONDecodeError):
+        return dict()
+
+
+def store_cache_index(index_name, index, cache_dir=CACHE_DIR):
+    """"""
+    os.makedirs(os.path.abspath(cache_dir), exist_ok=True)
+    write_json_atomically(os.path.join(os.path.abspath(cache_dir), index_name), index)
+
+
+def hash_file(file_path, cache_dir=CACHE_DIR):
+    """"""
+    # The content hash of a file is remembered together with its size and modification time, so that unchanged files
+    # are not read again
+    file_path = os.path.abspath(file_path)
+    file_stat = os.stat(file_path)
+    file_hashes = load_cache_index(FILE_HASHES_JSON, cache_dir)
+    if file_hashes.get(file_path, [None])[:2] == [file_stat.st_size, file_stat.st_mtime_ns]:
+        return file_hashes[file_path][2]
+
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+
+    file_hashes = load_cache_index(FILE_HASHES_JSON, cache_dir)
+    file_hashes[file_path] = [file_stat.st_size, file_stat.st_mtime_ns, file_hash.hexdigest()]
+    store_cache_index(FILE_HASHES_JSON, file_hashes, cache_dir)
+    return file_hash.hexdigest()
+
+
+def hash_parameters(*parameters):
+    """"""
+    # Always hashed as the standard library dumps them, so that the keys don't depend on the installed JSON backend
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cached_result_path(result_key, cache_dir=CACHE_DIR):
+    """"""
+    return os.path.join(os.path.abspath(cache_dir), 'results', f'{result_key}.json')
+
+
+def load_cached_result(result_key, cache_dir=CACHE_DIR):
+    """"""
+    result_path = cached_result_path(result_key, cache_dir)
+    try:
+        with open(result_path, 'rb') as json_file:
+            result = load(json_file)
+    except (FileNotFoundError, JSONDecodeError):
+        return None
+
+    # The modification time marks the last use of a result for the eviction
+    os.utime(result_path)
+    return result
+
+
+def store_cached_result(result_key, result, cache_dir=CACHE_DIR, cache_size_limit=CACHE_SIZE_LIMIT):
+    """"""
+    result_path = cached_result_path(result_key, cache_dir)
+    os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    write_json_atomically(result_path, result)
+    evict_cached_results(cache_dir, cache_size_limit)
+
+
+def evict_cached_results(cache_dir=CACHE_DIR, cache_size_limit=CACHE_SIZE_LIMIT):
+    """"""
+    # Evict the least recently used results until the cached results fit into the size limit
+    results_dir = os.path.join(os.path.abspath(cache_dir), 'results')
+    cached_results = list()
+    for result_filename in os.listdir(results_dir):
+        try:
+            result_stat = os.stat(os.path.join(results_dir, result_filename))
+        except FileNotFoundError:
+            continue
+        cached_results.append((result_stat.st_mtime, result_stat.st_size, result_filename))
+
+    cache_size = sum(result_size for _, result_size, _ in cached_results)
+    for _, result_size, result_filename in sorted(cached_results):
+        if cache_size <= cache_size_limit:
+            break
+        try:
+            os.remove(os.path.join(results_dir, result_filename))
+        except FileNotFoundError:
+            pass
+        cache_size -= result_size
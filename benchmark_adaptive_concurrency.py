@@ -0,0 +1,69 @@
+import random
+import asyncio
+from killboard_api_client import CONCURRENCY_LIMIT, AdaptiveConcurrencyController, run_until_complete
+
+SIMULATED_REQUESTS = 2000
+MEDIAN_LATENCY = 0.05
+# Sigma of the lognormal latencies of an uncongested server, about the spread of the production API
+LATENCY_SIGMA = 0.6
+# Number of concurrent requests a congested server serves without queueing them
+SERVER_CAPACITY = 4
+
+
+async def simulate_requests(concurrency_controller, sample_latency, request_count=SIMULATED_REQUESTS):
+    """"""
+    # Each request samples its latency given the number of requests completed so far and the requests in flight and
+    # reports it on release. Returns the limit of the controller after each request
+    limits = list()
+
+    async def simulate_request():
+        await concurrency_controller.acquire()
+        latency = sample_latency(len(limits), concurrency_controller.in_flight)
+        await asyncio.sleep(latency)
+        concurrency_controller.release(latency, success=True)
+        limits.append(concurrency_controller.limit)
+
+    await asyncio.gather(*(simulate_request() for _ in range(request_count)))
+    return limits
+
+
+def jittery_latency(completed_count, in_flight):
+    """"""
+    return MEDIAN_LATENCY * random.lognormvariate(0, LATENCY_SIGMA)
+
+
+def congested_latency(completed_count, in_flight):
+    """"""
+    # The server gets congested halfway through, from then on requests beyond its capacity queue up, so that the
+    # latency grows with the requests in flight
+    if completed_count < SIMULATED_REQUESTS // 2:
+        return jittery_latency(completed_count, in_flight)
+    return jittery_latency(completed_count, in_flight) * max(1, in_flight / SERVER_CAPACITY)
+
+
+def main():
+    """"""
+    random.seed(0)
+    print(f"Requests: {SIMULATED_REQUESTS}, median latency: {MEDIAN_LATENCY}s, max limit: {CONCURRENCY_LIMIT}\n\n"
+          f"{'Server:':<42}{'mean limit':>11}{'final limit':>12}")
+    simulated_limits = dict()
+    for description, sample_latency in [(f'jittery (lognormal sigma {LATENCY_SIGMA})', jittery_latency),
+                                        (f'congested (capacity {SERVER_CAPACITY})', congested_latency)]:
+        limits = run_until_complete(simulate_requests(AdaptiveConcurrencyController(CONCURRENCY_LIMIT),
+                                                      sample_latency))
+        # The first half is the warm-up of the latency baseline, the second half the one the server may be congested in
+        settled_limits = limits[len(limits) // 2:]
+        simulated_limits[description] = sum(settled_limits) / len(settled_limits)
+        print(f"{description + ':':<42}{simulated_limits[description]:>11.1f}{limits[-1]:>12}")
+
+    # The spread of the latencies of an uncongested server must not be taken for congestion, while a congested server
+    # must still make the limit back off
+    jittery_limit, congested_limit = simulated_limits.values()
+    assert jittery_limit >= CONCURRENCY_LIMIT / 2
+    assert congested_limit < jittery_limit
+
+    print('\nfin')
+
+
+if __name__ == '__main__':
+    main()
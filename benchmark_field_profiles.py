@@ -0,0 +1,38 @@
+import gzip
+import json
+from killboard_field_profiles import FIELD_PROFILES, build_selection, project_fields
+from scenario_statistics_stream import load_json_records
+from subdivide_scenario_statistics import require_partition_path
+
+SCENARIO_PARTITION = 't1_pug'
+
+
+def main():
+    """"""
+    statistics_path = require_partition_path(SCENARIO_PARTITION)
+    scenario_statistics = load_json_records(statistics_path)
+
+    # The stored records were scraped with the full profile, so projecting them onto a profile yields exactly what the
+    # API returns for its selection set. The gzip size approximates the transferred bytes as the requests accept gzip
+    profile_sizes = dict()
+    for profile_name, fields in FIELD_PROFILES.items():
+        projected_statistics = [project_fields(scenario_info, fields) for scenario_info in scenario_statistics.values()]
+        json_bytes = [len(json.dumps(scenario_info).encode('utf-8')) for scenario_info in projected_statistics]
+        gzip_bytes = [len(gzip.compress(json.dumps(scenario_info).encode('utf-8')))
+                      for scenario_info in projected_statistics]
+        query_bytes = len(build_selection(fields).encode('utf-8'))
+        profile_sizes[profile_name] = (sum(json_bytes) / len(json_bytes), sum(gzip_bytes) / len(gzip_bytes),
+                                       query_bytes)
+
+    full_json_bytes, full_gzip_bytes, _ = profile_sizes['full']
+    print(f"Source: {statistics_path} ({len(scenario_statistics)} scenarios)\n\n"
+          f"{'Profile:':<18}{'JSON B/scenario':>17}{'gzip B/scenario':>17}{'selection B':>13}")
+    for profile_name, (json_bytes, gzip_bytes, query_bytes) in profile_sizes.items():
+        print(f"{profile_name + ':':<18}{json_bytes:>10.0f} ({100 * json_bytes / full_json_bytes:>3.0f}%)"
+              f"{gzip_bytes:>10.0f} ({100 * gzip_bytes / full_gzip_bytes:>3.0f}%){query_bytes:>13}")
+
+    print('\nfin')
+
+
+if __name__ == '__main__':
+    main()
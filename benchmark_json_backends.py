@@ -0,0 +1,50 @@
+import time
+from json_backend import JSON_BACKENDS, JSON_BACKEND_PREFERENCE, json_backend
+from scenario_statistics_stream import iter_json_object_items
+
+SCENARIO_STATISTICS_JSON = './subdivided_scenario_statistics/scenario_statistics_t1_pug.json'
+BENCHMARK_REPEATS = 5
+
+
+def best_duration(function, repeats=BENCHMARK_REPEATS):
+    """"""
+    durations = list()
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def main():
+    """"""
+    # Load is the decoding of the whole file as read, dump the encoding of the decoded statistics back to JSON. The
+    # incremental decoding of the standard library is what files too large to be decoded at once are read with
+    with open(SCENARIO_STATISTICS_JSON, 'rb') as json_file:
+        json_bytes = json_file.read()
+    scenario_statistics = JSON_BACKENDS['json'].loads(json_bytes)
+
+    print(f"Source: {SCENARIO_STATISTICS_JSON} ({len(json_bytes)} bytes, {len(scenario_statistics)} scenarios)\n"
+          f"Backend in use: {json_backend.name}\n\n"
+          f"{'Backend:':<24}{'load ms':>9}{'MB/s':>8}{'dump ms':>9}")
+    for backend_name in JSON_BACKEND_PREFERENCE:
+        if backend_name not in JSON_BACKENDS:
+            print(f"{backend_name + ':':<24}{'not installed':>17}")
+            continue
+        backend = JSON_BACKENDS[backend_name]
+        assert backend.loads(json_bytes) == scenario_statistics
+        load_duration = best_duration(lambda: backend.loads(json_bytes))
+        dump_duration = best_duration(lambda: backend.dumps(scenario_statistics))
+        print(f"{backend_name + ':':<24}{1000 * load_duration:>9.1f}{len(json_bytes) / load_duration / 2 ** 20:>8.1f}"
+              f"{1000 * dump_duration:>9.1f}")
+
+    incremental_duration = best_duration(lambda: dict(iter_json_object_items(SCENARIO_STATISTICS_JSON,
+                                                                             whole_file_decode_limit=0)))
+    print(f"{'json (incremental):':<24}{1000 * incremental_duration:>9.1f}"
+          f"{len(json_bytes) / incremental_duration / 2 ** 20:>8.1f}")
+
+    print('\nfin')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import gc
+import time
+import tracemalloc
+from scenario_statistics_stream import load_json_records
+from scenario_records import load_scenario_records
+from subdivide_scenario_statistics import PARTITION_NAMES, find_partition_path
+
+REPRESENTATIONS = {'dict': load_json_records, 'record': load_scenario_records}
+
+
+def measure_loaded_memory(load_statistics, statistics_paths):
+    """"""
+    # Memory still allocated once the statistics of all paths are loaded, i.e. what holding them at once costs, and the
+    # time it took to load them
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    loaded_statistics = [load_statistics(statistics_path) for statistics_path in statistics_paths]
+    load_duration = time.perf_counter() - start_time
+    loaded_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    scenario_count = sum(len(scenario_statistics) for scenario_statistics in loaded_statistics)
+    entry_count = sum(len(scenario['scoreboardEntries'] if isinstance(scenario, dict) else scenario.scoreboardEntries)
+                      for scenario_statistics in loaded_statistics for scenario in scenario_statistics.values())
+    return loaded_bytes, load_duration, scenario_count, entry_count
+
+
+def main():
+    """"""
+    partition_paths = {partition_name: find_partition_path(partition_name) for partition_name in PARTITION_NAMES}
+    partition_paths = {partition_name: partition_path for partition_name, partition_path in partition_paths.items()
+                       if partition_path is not None}
+    benchmark_paths = [([partition_path], partition_name) for partition_name, partition_path in partition_paths.items()]
+    benchmark_paths.append((list(partition_paths.values()), 'all at once'))
+
+    print(f"{'Partition:':<18}{'scenarios':>10}{'entries':>9}"
+          + ''.join(f"{representation + ' MB':>11}{'B/entry':>9}{'load s':>8}" for representation in REPRESENTATIONS))
+    for statistics_paths, description in benchmark_paths:
+        line = ''
+        for load_statistics in REPRESENTATIONS.values():
+            loaded_bytes, load_duration, scenario_count, entry_count = measure_loaded_memory(load_statistics,
+                                                                                             statistics_paths)
+            line += f'{loaded_bytes / 2 ** 20:>11.1f}{loaded_bytes / max(entry_count, 1):>9.0f}{load_duration:>8.2f}'
+        print(f"{description + ':':<18}{scenario_count:>10}{entry_count:>9}" + line)
+
+    print('\nfin')
+
+
+if __name__ == '__main__':
+    main()
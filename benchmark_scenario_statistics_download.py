@@ -0,0 +1,57 @@
+import time
+from killboard_api_client import run_until_complete
+from killboard_stub_server import start_stub_server
+from scenario_statistics_stream import load_json_records
+from subdivide_scenario_statistics import require_partition_path
+from download_killboard_scenario_statistics import download_scenario_statistics, download_scenario_statistics_serial
+
+STUB_SCENARIO_PARTITION = 't1_pug'
+STUB_LATENCY = 0.05
+STUB_LATENCY_JITTER = 0.6
+BENCHMARK_SCENARIO_COUNT = 200
+CONCURRENCY_LIMITS = [4, 16, 64]
+BATCH_SIZES = [1, 10, 25]
+
+
+def main():
+    """"""
+    statistics_path = require_partition_path(STUB_SCENARIO_PARTITION)
+    scenario_statistics = load_json_records(statistics_path)
+
+    server, api_url = start_stub_server(scenario_statistics, latency=STUB_LATENCY,
+                                        latency_jitter=STUB_LATENCY_JITTER)
+    scenario_ids = list(scenario_statistics.keys())[:BENCHMARK_SCENARIO_COUNT]
+
+    start_time = time.perf_counter()
+    serial_statistics = download_scenario_statistics_serial(scenario_ids, api_url=api_url)
+    serial_duration = time.perf_counter() - start_time
+
+    results = [('serial', serial_duration, server.request_count)]
+    for concurrency_limit in CONCURRENCY_LIMITS:
+        for batch_size in BATCH_SIZES:
+            # The rate limiter is disabled as the stub server is local
+            server.request_count = 0
+            start_time = time.perf_counter()
+            async_statistics = run_until_complete(download_scenario_statistics(scenario_ids, api_url=api_url,
+                                                                               concurrency_limit=concurrency_limit,
+                                                                               requests_per_second=None,
+                                                                               batch_size=batch_size))
+            async_duration = time.perf_counter() - start_time
+            assert async_statistics == serial_statistics
+            results.append((f'async ({concurrency_limit} concurrent, batch {batch_size})', async_duration,
+                            server.request_count))
+
+    server.shutdown()
+
+    print(f"\nSource: {statistics_path}\n"
+          f"Scenarios: {len(scenario_ids)}, simulated latency: {STUB_LATENCY}s "
+          f"(lognormal sigma {STUB_LATENCY_JITTER})\n")
+    for description, duration, request_count in results:
+        print(f"{description + ':':<37}{duration:>7.2f}s ({len(scenario_ids) / duration:>7.1f} scenarios/s, "
+              f"{request_count:>4} requests, speedup {serial_duration / duration:.1f}x)")
+
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import os
+from statistics import mean
+from multiprocessing import Pool
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from analysis_result_cache import hash_parameters, load_cache_index, store_cache_index
+
+RENDER_PROCESS_COUNT = os.cpu_count()
+RENDERED_TABLES_JSON = 'rendered_tables.json'
+# Part of the hash of a rendered table. To be increased whenever a change to render_table() changes the rendered tables
+TABLE_LAYOUT_VERSION = 1
+
+
+def div_zero(a, b):
+    """"""
+    return a / b if b else 0
+
+
+def create_table_values(realm_career_relative_stat, realm_careers):
+    """"""
+    row_labels = realm_careers
+    col_labels = realm_careers + ['ROW-AVERAGE']
+
+    table_values = list()
+    for row_career in row_labels:
+        row_values = list()
+        row_values_avg_acc = (list(), list())
+        for col_career in col_labels:
+            if row_career == col_career:
+                row_values.append("")
+            elif col_career == 'ROW-AVERAGE':
+                if not row_values_avg_acc[0]:
+                    row_values.append("(DPs: 0)")
+                    continue
+                row_value_own = mean(row_values_avg_acc[0])
+                row_value_other = mean(row_values_avg_acc[1])
+                if row_value_own < 100:
+                    row_value_own = round(row_value_own, 1)
+                    row_value_other = round(row_value_other, 1)
+                else:
+                    row_value_own = round(row_value_own)
+                    row_value_other = round(row_value_other)
+                relation = round(div_zero(row_value_own, row_value_other), 2)
+                row_values.append(f"{row_value_own}:{row_value_other}\n"
+                                  f"{relation}")
+            else:
+                own_stat = realm_career_relative_stat[row_career][col_career]['own']
+                other_stat = realm_career_relative_stat[row_career][col_career]['other']
+                if own_stat is None or other_stat is None:
+                    row_values.append('(DPs: 0)')
+                    continue
+                relation = round(div_zero(own_stat, other_stat), 2)
+                datapoint_count = realm_career_relative_stat[row_career][col_career]['datapoints']
+                row_values.append(f"{own_stat}:{other_stat}\n"
+                                  f"{relation}\n"
+                                  f"(DPs: {datapoint_count})")
+                row_values_avg_acc[0].append(own_stat)
+                row_values_avg_acc[1].append(other_stat)
+        table_values.append(row_values)
+
+    return row_labels, col_labels, table_values
+
+
+def create_table_jobs(career_relative, comparison, table_title, table_outdir, source):
+    """"""
+    table_output_dir = os.path.abspath(table_outdir)
+    os.makedirs(table_output_dir, exist_ok=True)
+
+    table_jobs = list()
+    for description, career_relative_stat in career_relative.items():
+        for realm, realm_career_relative_stat in career_relative_stat.items():
+            row_labels, col_labels, table_values = create_table_values(realm_career_relative_stat,
+                                                                       comparison['careers'][realm])
+            table_jobs.append({
+                'row_labels': row_labels,
+                'col_labels': col_labels,
+                'table_values': table_values,
+                'table_size': comparison['table_size'],
+                'title': table_title.format(description, realm) + f'\n\nsource: {source}',
+                'filepath': table_output_dir + '/' + table_title.format(description, realm) + '.png'
+            })
+    return table_jobs
+
+
+def render_table(table_job):
+    """"""
+    # The figure is drawn by the Agg canvas directly instead of through pyplot, so that it is not registered with any
+    # pyplot state and is freed as soon as it is saved
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    fig.set_figheight(table_job['table_size'][0])
+    fig.set_figwidth(table_job['table_size'][1])
+    ax.set_axis_off()
+    table = ax.table(cellText=table_job['table_values'],
+                     rowLabels=table_job['row_labels'],
+                     colLabels=table_job['col_labels'],
+                     rowColours=['lightblue'] * len(table_job['row_labels']),
+                     colColours=['lightblue'] * (len(table_job['col_labels']) - 1) + ['coral'],
+                     cellLoc='center',
+                     loc='upper left')
+    table.auto_set_font_size(False)
+    for _, cell in table.get_celld().items():
+        cell.set_text_props(fontproperties=FontProperties(size=3, weight='bold'))
+
+    ax.set_title(table_job['title'], fontsize=6, fontweight="bold")
+    fig.savefig(table_job['filepath'], dpi=600, bbox_inches='tight')
+    return table_job['filepath']
+
+
+def render_tables(table_jobs, process_count=RENDER_PROCESS_COUNT, pool=None):
+    """"""
+    # Tables whose file was rendered from the very same table job and layout are not rendered again
+    rendered_tables = load_cache_index(RENDERED_TABLES_JSON)
+    table_hashes = {table_job['filepath']: hash_parameters(TABLE_LAYOUT_VERSION, table_job) for table_job in table_jobs}
+    pending_table_jobs = [table_job for table_job in table_jobs if not os.path.exists(table_job['filepath'])
+                          or rendered_tables.get(table_job['filepath']) != table_hashes[table_job['filepath']]]
+
+    # Tables are rendered in a process pool, either the given one or a new one, unless there is only a single worker
+    if pool is not None:
+        rendered_filepaths = list(pool.imap_unordered(render_table, pending_table_jobs))
+    elif process_count <= 1 or len(pending_table_jobs) <= 1:
+        rendered_filepaths = [render_table(table_job) for table_job in pending_table_jobs]
+    else:
+        with Pool(min(process_count, len(pending_table_jobs))) as render_pool:
+            rendered_filepaths = list(render_pool.imap_unordered(render_table, pending_table_jobs))
+
+    if rendered_filepaths:
+        rendered_tables = load_cache_index(RENDERED_TABLES_JSON)
+        rendered_tables.update({filepath: table_hashes[filepath] for filepath in rendered_filepaths})
+        store_cache_index(RENDERED_TABLES_JSON, rendered_tables)
+    return rendered_filepaths
+
+
+def plot_career_relative_tables(career_relative, comparison, table_title, table_outdir, source,
+                                process_count=RENDER_PROCESS_COUNT):
+    """"""
+    return render_tables(create_table_jobs(career_relative, comparison, table_title, table_outdir, source),
+                         process_count)
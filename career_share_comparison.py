@@ -0,0 +1,322 @@
+import itertools
+import numpy as np
+from columnar_scenario_statistics import ORDER_CAREERS, DESTRO_CAREERS, CAREERS, CAREER_TABLE, CAREER_REALMS, REALMS, \
+    UNKNOWN_CAREER_CODE, load_columnar_scenario_statistics
+from string_tables import StringTable
+from scenario_realm_aggregates import load_scenario_realm_aggregates
+from share_accumulators import EXACT_SHARE_LIMIT, SWEEP_EXACT_SHARE_LIMIT, PairShareMeanAccumulator, \
+    PairShareTrimmedMeanAccumulator
+from analysis_result_cache import hash_file, hash_parameters, load_cached_result, store_cached_result
+
+# A comparison only considers the scoreboard entries of its careers that are focused on the 'performance' counters, i.e.
+# whose performance is higher than the sum of their 'opposition' counters, and that achieved at least the late
+# threshold of the top performance of their realm in the scenario. Each metric is the sum of its counters and is
+# rounded to the given number of digits
+HEALER_COMPARISON = {
+    'careers': {'order': ['ARCHMAGE', 'RUNE_PRIEST', 'WARRIOR_PRIEST'],
+                'destro': ['SHAMAN', 'ZEALOT', 'DISCIPLE']},
+    'performance': ['healing', 'protection'],
+    'opposition': ['damage'],
+    'metrics': {'healing': (['healing'], None),
+                'protection': (['protection'], None),
+                'protection_and_heal': (['healing', 'protection'], None),
+                'damage_and_protection_and_heal': (['healing', 'protection', 'damage'], None)},
+    'table_size': (1, 2)
+}
+TANK_COMPARISON = dict(HEALER_COMPARISON,
+                       careers={'order': ['SWORDMASTER', 'IRONBREAKER', 'KNIGHT'],
+                                'destro': ['BLACK_ORC', 'BLACKGUARD', 'CHOSEN']})
+DD_COMPARISON = {
+    'careers': {'order': ORDER_CAREERS,
+                'destro': DESTRO_CAREERS},
+    'performance': ['damage'],
+    'opposition': ['healing', 'protection'],
+    'metrics': {'damage': (['damage'], None),
+                'deathblows': (['deathBlows'], 1),
+                'kill_damage': (['killDamage'], None)},
+    'table_size': (3, 6.4)
+}
+CAREER_COMPARISONS = {'healer': HEALER_COMPARISON, 'tank': TANK_COMPARISON, 'dd': DD_COMPARISON}
+
+# Part of the key of cached comparison results. To be increased whenever a change to the engine changes its results
+ANALYSIS_VERSION = 1
+
+# Number of scenarios whose career shares are held in memory at once
+COMPARISON_CHUNK_SIZE = 4096
+
+
+def round_none(a, b=None):
+    """"""
+    if b is None:
+        return None if a is None else round(a)
+    else:
+        return None if a is None else round(a, b)
+
+
+def sum_counters(entry_statistics, counters):
+    """"""
+    return sum(entry_statistics[counter].astype(np.int64) for counter in counters)
+
+
+def comparison_careers(comparison):
+    """"""
+    return [career for realm in REALMS for career in comparison['careers'][realm]]
+
+
+def iter_scenario_chunks(columnar_statistics, chunk_size):
+    """"""
+    # The entries of a scenario are stored consecutively, so a chunk of scenarios is a slice of the entry arrays. All
+    # arrays but the per scenario ones and the string tables are entry arrays. The per scenario realm aggregates, if
+    # loaded, are passed along with the entries of their scenarios
+    scenario_entry_offsets = columnar_statistics['scenario_entry_offsets']
+    entry_columns = [array_name for array_name in columnar_statistics if array_name == 'scenario_index'
+                     or not array_name.startswith(('scenario_', 'table_'))]
+    realm_aggregates = [array_name for array_name in columnar_statistics if array_name.startswith('scenario_realm_')]
+    for scenario_start in range(0, len(scenario_entry_offsets) - 1, chunk_size):
+        scenario_end = min(scenario_start + chunk_size, len(scenario_entry_offsets) - 1)
+        entry_start, entry_end = scenario_entry_offsets[scenario_start], scenario_entry_offsets[scenario_end]
+        entry_statistics = {array_name: columnar_statistics[array_name][entry_start:entry_end]
+                            for array_name in entry_columns}
+        entry_statistics['scenario_index'] = entry_statistics['scenario_index'] - scenario_start
+        entry_statistics.update({array_name: columnar_statistics[array_name][scenario_start:scenario_end]
+                                 for array_name in realm_aggregates})
+        yield scenario_end - scenario_start, entry_statistics
+
+
+def compute_career_shares(entry_statistics, scenario_count, comparison, parameter_grid):
+    """"""
+    # Careers are indexed in the order of comparison_careers(), entries of other careers get the index NO_CODE (-1)
+    careers = comparison_careers(comparison)
+    career_realms = CAREER_REALMS[CAREER_TABLE.encode(careers)]
+
+    entry_career = CAREER_TABLE.positions(careers)[entry_statistics['career']]
+    entry_scenario_index = entry_statistics['scenario_index'].astype(np.int64)
+    entry_scenario_realm = entry_scenario_index * len(REALMS) + CAREER_REALMS[entry_statistics['career']]
+    entry_scenario_career = entry_scenario_index * len(careers) + entry_career
+
+    # Disregard the careers not part of the comparison and the character stats not focused on the performance counters,
+    # e.g. offensively specced healers and tanks or defensively and support specced damage dealers
+    in_comparison = entry_career >= 0
+    performance = sum_counters(entry_statistics, comparison['performance'])
+    focused = performance > sum_counters(entry_statistics, comparison['opposition'])
+
+    # Disregard character stats if they achieved less than DISREGARD_LATE_THRESHOLD * top performance of the compared
+    # careers of their realm, which is presumably because they joined the scenario late. The stats selected by a higher
+    # threshold are a subset of those selected by a lower one, so each stat is put into the bucket of the highest
+    # threshold of the parameter grid it still passes, and the sums for a threshold are the sums of its bucket and all
+    # higher ones
+    disregard_late_thresholds = sorted(set(disregard_late_threshold for disregard_late_threshold, _ in parameter_grid))
+    # If the comparison is of all careers and its performance a single counter, the top performance of a realm is looked
+    # up in the realm aggregates instead, unless they include entries of unknown careers
+    top_performance_aggregate = f"scenario_realm_max_{comparison['performance'][0]}"
+    if len(careers) == len(CAREERS) and len(comparison['performance']) == 1 \
+            and top_performance_aggregate in entry_statistics \
+            and not np.any(entry_statistics['career'] == UNKNOWN_CAREER_CODE):
+        top_performance = entry_statistics[top_performance_aggregate].ravel()
+    else:
+        top_performance = np.zeros(scenario_count * len(REALMS), dtype=np.int64)
+        np.maximum.at(top_performance, entry_scenario_realm[in_comparison], performance[in_comparison])
+    joined_late = performance < top_performance[entry_scenario_realm] * np.array(disregard_late_thresholds)[:, None]
+    passed_thresholds = np.count_nonzero(~joined_late, axis=0)
+    entry_index = np.flatnonzero(in_comparison & focused & (passed_thresholds > 0))
+    threshold_bucket = passed_thresholds[entry_index] - 1
+
+    def threshold_sums(keys, key_count, weights=None):
+        """"""
+        bucket_sums = np.bincount(threshold_bucket * key_count + keys, weights=weights,
+                                  minlength=len(disregard_late_thresholds) * key_count)
+        return np.cumsum(bucket_sums.reshape(len(disregard_late_thresholds), key_count)[::-1], axis=0)[::-1]
+
+    # The sums are computed once per RR_NORMALIZATION value and picked for each point of the parameter grid
+    rr_normalizations = sorted(set(bool(rr_normalization) for _, rr_normalization in parameter_grid))
+    rr_norms = [80 / np.minimum(80, entry_statistics['renownRank'][entry_index]) if rr_normalization
+                else np.ones(len(entry_index)) for rr_normalization in rr_normalizations]
+    grid_thresholds = [disregard_late_thresholds.index(disregard_late_threshold)
+                       for disregard_late_threshold, _ in parameter_grid]
+    grid_rr_normalizations = [rr_normalizations.index(bool(rr_normalization)) for _, rr_normalization in parameter_grid]
+
+    # Grid x scenario x career matrices of the count of selected characters and of each career's mean share of the
+    # scenario total of its realm for each metric. A career is present in a scenario if it has at least one selected
+    # character
+    scenario_careers = entry_scenario_career[entry_index]
+    scenario_realms = entry_scenario_realm[entry_index]
+    career_counts = threshold_sums(scenario_careers, scenario_count * len(careers))[grid_thresholds]
+    career_counts = career_counts.reshape(len(parameter_grid), scenario_count, len(careers))
+    career_shares = np.zeros((len(parameter_grid), len(comparison['metrics']), scenario_count, len(careers)))
+    scenario_realm_totals = np.zeros((len(parameter_grid), len(comparison['metrics']), scenario_count, len(REALMS)))
+    for metric_index, (counters, _) in enumerate(comparison['metrics'].values()):
+        metric_values = sum_counters(entry_statistics, counters)[entry_index]
+        realm_totals = np.stack([threshold_sums(scenario_realms, scenario_count * len(REALMS), metric_values * rr_norm)
+                                 for rr_norm in rr_norms])
+        career_sums = np.stack([threshold_sums(scenario_careers, scenario_count * len(careers), metric_values * rr_norm)
+                                for rr_norm in rr_norms])
+        scenario_realm_totals[:, metric_index] = realm_totals[grid_rr_normalizations, grid_thresholds].reshape(
+            len(parameter_grid), scenario_count, len(REALMS))
+        career_means = career_sums[grid_rr_normalizations, grid_thresholds].reshape(
+            len(parameter_grid), scenario_count, len(careers)) / np.maximum(career_counts, 1)
+        career_realm_totals = scenario_realm_totals[:, metric_index][:, :, career_realms]
+        np.divide(career_means, career_realm_totals, out=career_shares[:, metric_index],
+                  where=career_realm_totals != 0)
+
+    return career_counts > 0, career_shares, scenario_realm_totals
+
+
+def comparison_pairs(comparison):
+    """"""
+    # The (x, y) indices of the careers paired in the results of a comparison, i.e. of the careers of the same realm
+    careers = comparison_careers(comparison)
+    return [(x, y) for x, y in itertools.permutations(range(len(careers)), 2)
+            if CAREER_REALMS[CAREER_TABLE.code(careers[x])] == CAREER_REALMS[CAREER_TABLE.code(careers[y])]]
+
+
+def create_comparison_accumulator(comparison, disregard_worst_performances_values, exact_limit=EXACT_SHARE_LIMIT):
+    """"""
+    # Running means for the untrimmed results, share sketches only if any trimmed result is asked for and only of the
+    # pairings that are part of the results
+    career_count, metric_count = len(comparison_careers(comparison)), len(comparison['metrics'])
+    comparison_accumulator = {'realm_totals': [[0] * len(REALMS) for _ in comparison['metrics']]}
+    if not all(disregard_worst_performances_values):
+        comparison_accumulator['pair_share_means'] = PairShareMeanAccumulator(career_count, metric_count)
+    if any(disregard_worst_performances_values):
+        comparison_accumulator['pair_share_sketches'] = PairShareTrimmedMeanAccumulator(
+            career_count, metric_count, exact_limit, pairs=comparison_pairs(comparison))
+    return comparison_accumulator
+
+
+def accumulate_career_shares(comparison_accumulator, career_present, career_shares, scenario_realm_totals):
+    """"""
+    for pair_share_accumulator in ('pair_share_means', 'pair_share_sketches'):
+        if pair_share_accumulator in comparison_accumulator:
+            comparison_accumulator[pair_share_accumulator].update(career_present, career_shares)
+
+    # The scenario totals are summed up in scenario order, the same as a running total per scenario would be
+    for metric_index, metric_realm_totals in enumerate(comparison_accumulator['realm_totals']):
+        for realm_index in range(len(REALMS)):
+            metric_realm_totals[realm_index] = sum(scenario_realm_totals[metric_index, :, realm_index].tolist(),
+                                                   metric_realm_totals[realm_index])
+
+
+def create_career_relative(comparison_accumulator, comparison, scenario_count, disregard_worst_performances):
+    """"""
+    # Now that the mean share for each career relationship is known and also the mean of each metric over all scenarios
+    # for the respective realm, can the mean share be converted back to absolute numbers taking that mean as reference.
+    # The shares of the other career y when paired with career x are the own shares of the pairing of y with x
+    career_table = StringTable(comparison_careers(comparison))
+    if not disregard_worst_performances:
+        pair_share_means = comparison_accumulator['pair_share_means']
+        pair_count, mean_shares = pair_share_means.pair_count, pair_share_means.mean_shares
+    else:
+        pair_share_sketches = comparison_accumulator['pair_share_sketches']
+        pair_count = pair_share_sketches.pair_count
+        mean_shares = lambda x, y: pair_share_sketches.mean_shares(x, y, disregard_worst_performances)
+
+    career_relative = {description: {realm: dict() for realm in REALMS} for description in comparison['metrics']}
+    for realm_index, realm in enumerate(REALMS):
+        for career_x in comparison['careers'][realm]:
+            for description in comparison['metrics']:
+                career_relative[description][realm][career_x] = dict()
+            for career_y in comparison['careers'][realm]:
+                if career_x == career_y:
+                    continue
+                x, y = career_table.code(career_x), career_table.code(career_y)
+                if not disregard_worst_performances:
+                    datapoint_count = pair_count(x, y)
+                else:
+                    datapoint_count = int(pair_count(x, y) * (1 - disregard_worst_performances))
+
+                mean_own_shares = mean_shares(x, y)
+                mean_other_shares = mean_shares(y, x)
+                for metric_index, (description, (_, ndigits)) in enumerate(comparison['metrics'].items()):
+                    # Without scenarios there are no shares either, so that the mean is never used
+                    realm_total = comparison_accumulator['realm_totals'][metric_index][realm_index]
+                    realm_mean = realm_total / scenario_count if scenario_count else 0
+                    mean_own_share, mean_other_share = mean_own_shares[metric_index], mean_other_shares[metric_index]
+                    career_relative[description][realm][career_x][career_y] = {
+                        'own': round_none(None if mean_own_share is None else mean_own_share * realm_mean, ndigits),
+                        'other': round_none(None if mean_other_share is None else mean_other_share * realm_mean,
+                                            ndigits),
+                        'datapoints': datapoint_count
+                    }
+
+    return career_relative
+
+
+def compare_career_shares_grid(columnar_statistics, comparisons, disregard_late_thresholds,
+                               disregard_worst_performances_values, rr_normalizations,
+                               chunk_size=COMPARISON_CHUNK_SIZE):
+    """"""
+    # A single pass over the scenarios in chunks updates the running pair counts, share sums and realm totals of all
+    # metrics of all comparisons for every point of the parameter grid, so memory only grows with the number of
+    # compared careers, metrics and grid points. The trimmed means of all DISREGARD_WORST_PERFORMANCES values are taken
+    # from the same share distribution
+    parameter_grid = list(itertools.product(disregard_late_thresholds, rr_normalizations))
+    # The shares differ between grid points, so each has its own sketches. As a sweep holds the sketches of all of its
+    # grid points at once, each of them keeps fewer shares exact before it bins them
+    exact_limit = EXACT_SHARE_LIMIT if len(parameter_grid) == 1 else SWEEP_EXACT_SHARE_LIMIT
+    comparison_accumulators = {comparison_name: [create_comparison_accumulator(comparison,
+                                                                               disregard_worst_performances_values,
+                                                                               exact_limit)
+                                                 for _ in parameter_grid]
+                               for comparison_name, comparison in comparisons.items()}
+    scenario_count = 0
+    for chunk_scenario_count, entry_statistics in iter_scenario_chunks(columnar_statistics, chunk_size):
+        for comparison_name, comparison in comparisons.items():
+            career_present, career_shares, scenario_realm_totals = compute_career_shares(
+                entry_statistics, chunk_scenario_count, comparison, parameter_grid)
+            for grid_index, comparison_accumulator in enumerate(comparison_accumulators[comparison_name]):
+                accumulate_career_shares(comparison_accumulator, career_present[grid_index], career_shares[grid_index],
+                                         scenario_realm_totals[grid_index])
+        scenario_count += chunk_scenario_count
+
+    grid_career_relatives = dict()
+    for grid_index, (disregard_late_threshold, rr_normalization) in enumerate(parameter_grid):
+        for disregard_worst_performances in disregard_worst_performances_values:
+            grid_career_relatives[(disregard_late_threshold, disregard_worst_performances, rr_normalization)] = {
+                comparison_name: create_career_relative(comparison_accumulators[comparison_name][grid_index],
+                                                        comparison, scenario_count, disregard_worst_performances)
+                for comparison_name, comparison in comparisons.items()
+            }
+    return grid_career_relatives
+
+
+def compare_all_career_shares(columnar_statistics, comparisons, disregard_late_threshold, disregard_worst_performances,
+                              rr_normalization, chunk_size=COMPARISON_CHUNK_SIZE):
+    """"""
+    return compare_career_shares_grid(columnar_statistics, comparisons, [disregard_late_threshold],
+                                      [disregard_worst_performances], [rr_normalization],
+                                      chunk_size)[(disregard_late_threshold, disregard_worst_performances,
+                                                   rr_normalization)]
+
+
+def compare_career_shares(columnar_statistics, comparison, disregard_late_threshold, disregard_worst_performances,
+                          rr_normalization, chunk_size=COMPARISON_CHUNK_SIZE):
+    """"""
+    return compare_all_career_shares(columnar_statistics, {'comparison': comparison}, disregard_late_threshold,
+                                     disregard_worst_performances, rr_normalization, chunk_size)['comparison']
+
+
+def load_comparison_statistics(statistics_path):
+    """"""
+    # The columnar statistics together with the per scenario realm aggregates of the partition
+    # The columnar statistics of a partition without scenarios lack the counters the aggregates are built from
+    columnar_statistics = load_columnar_scenario_statistics(statistics_path)
+    if len(columnar_statistics['scenario_instance_id']):
+        columnar_statistics.update(load_scenario_realm_aggregates(statistics_path, columnar_statistics))
+    return columnar_statistics
+
+
+def compare_cached_career_shares(statistics_path, comparisons, disregard_late_threshold, disregard_worst_performances,
+                                 rr_normalization, columnar_statistics=None):
+    """"""
+    # Results are cached under a hash of the content of the statistics file, the comparisons, the parameters and the
+    # analysis version. The statistics are only loaded, if not given, when the result is not cached
+    result_key = hash_parameters(ANALYSIS_VERSION, hash_file(statistics_path), comparisons, disregard_late_threshold,
+                                 disregard_worst_performances, rr_normalization)
+    career_relatives = load_cached_result(result_key)
+    if career_relatives is None:
+        if columnar_statistics is None:
+            columnar_statistics = load_comparison_statistics(statistics_path)
+        career_relatives = compare_all_career_shares(columnar_statistics, comparisons, disregard_late_threshold,
+                                                     disregard_worst_performances, rr_normalization)
+        store_cached_result(result_key, career_relatives)
+    return career_relatives
@@ -0,0 +1,204 @@
+import os
+import glob
+import hashlib
+import numpy as np
+from tqdm import tqdm
+from scenario_statistics_stream import json_records_stem
+from scenario_records import iter_scenario_records
+from string_tables import NO_CODE, StringTable
+from analysis_result_cache import hash_file
+
+SUBDIVIDED_JSON_DIR = './subdivided_scenario_statistics/'
+COLUMNAR_OUTPUT_DIR = './columnar_scenario_statistics/'
+# Array of a columnar store holding the content hash of the statistics file it was built from
+STATISTICS_HASH_ARRAY = 'statistics_sha256'
+
+ORDER_CAREERS = ['SWORDMASTER', 'IRONBREAKER', 'KNIGHT', 'WHITE_LION', 'SLAYER', 'WITCH_HUNTER', 'ENGINEER',
+                 'SHADOW_WARRIOR', 'BRIGHT_WIZARD', 'ARCHMAGE', 'RUNE_PRIEST', 'WARRIOR_PRIEST']
+DESTRO_CAREERS = ['BLACK_ORC', 'BLACKGUARD', 'CHOSEN', 'MARAUDER', 'CHOPPA', 'WITCH_ELF', 'MAGUS', 'SQUIG_HERDER',
+                  'SORCERER', 'SHAMAN', 'ZEALOT', 'DISCIPLE']
+CAREERS = ORDER_CAREERS + DESTRO_CAREERS
+REALMS = ['order', 'destro']
+QUEUE_TYPES = ['STANDARD', 'PUG', 'DUO', 'CITY', 'GROUP_RANKED']
+
+# Careers, realms and queue types are coded by fixed string tables shared by all statistics files. The realm of a career
+# code is CAREER_REALMS[career code], a realm code. Careers missing from CAREERS are coded as UNKNOWN_CAREER, which is of
+# no comparison and counted to destro, the same as the original analysis scripts did with any career not of order
+UNKNOWN_CAREER = 'UNKNOWN'
+CAREER_TABLE = StringTable(CAREERS + [UNKNOWN_CAREER])
+REALM_TABLE = StringTable(REALMS)
+QUEUE_TYPE_TABLE = StringTable(QUEUE_TYPES)
+CAREER_CODES = CAREER_TABLE.string_codes
+UNKNOWN_CAREER_CODE = CAREER_TABLE.code(UNKNOWN_CAREER)
+CAREER_REALMS = np.array([REALM_TABLE.code('order')] * len(ORDER_CAREERS)
+                         + [REALM_TABLE.code('destro')] * (len(DESTRO_CAREERS) + 1), dtype=np.int8)
+
+# Characters and guilds are coded by the string table of their ids each statistics file is built with. A table is
+# stored as the 'table_<name>_id' and 'table_<name>_name' arrays, where the id and last seen name of code c are at
+# index c. Entries without a guild or of a character whose id was not scraped have the code NO_CODE
+INTERNED_ENTITIES = ['character', 'guild']
+
+# Scoreboard counters stored per entry. Counters missing from the scraped field profile are not stored
+ENTRY_COUNTERS = {
+    'team': np.int8,
+    'level': np.int16,
+    'renownRank': np.int16,
+    'quitter': np.bool_,
+    'protection': np.int32,
+    'kills': np.int32,
+    'deathBlows': np.int32,
+    'deaths': np.int32,
+    'damage': np.int32,
+    'healing': np.int32,
+    'objectiveScore': np.int32,
+    'killsSolo': np.int32,
+    'killDamage': np.int32,
+    'healingSelf': np.int32,
+    'healingOthers': np.int32,
+    'protectionSelf': np.int32,
+    'protectionOthers': np.int32,
+    'damageReceived': np.int32,
+    'resurrectionsDone': np.int32,
+    'healingReceived': np.int32,
+    'protectionReceived': np.int32
+}
+
+
+def career_code(career):
+    """"""
+    return CAREER_CODES.get(career, UNKNOWN_CAREER_CODE)
+
+
+def build_columnar_scenario_statistics(statistics_path):
+    """"""
+    return columnarize_scenario_statistics(iter_scenario_records(statistics_path))
+
+
+def columnarize_scenario_statistics(scenario_records):
+    """"""
+    # Scenario records are (scenario id, scenario record) items, e.g. of a statistics file or a query of the scenario
+    # statistics store. Per scenario arrays are prefixed with 'scenario_'. The scoreboard entries of all scenarios are
+    # concatenated and each entry refers to its scenario through 'scenario_index', scenario i owns the entries
+    # scenario_entry_offsets[i]:scenario_entry_offsets[i + 1]. String tables are prefixed with 'table_'
+    scenario_columns = {'instance_id': list(), 'queue_type': list(), 'start_time': list(), 'end_time': list(),
+                        'points': list(), 'entry_offsets': [0]}
+    entry_columns = {'scenario_index': list(), 'career': list()}
+    entry_columns.update({entity: list() for entity in INTERNED_ENTITIES})
+    entry_counters = None
+    entity_tables = {entity: StringTable() for entity in INTERNED_ENTITIES}
+    entity_names = {entity: list() for entity in INTERNED_ENTITIES}
+
+    for scenario_index, (scenario_id, scenario) in enumerate(scenario_records):
+        scenario_columns['instance_id'].append(scenario_id)
+        scenario_columns['queue_type'].append(QUEUE_TYPE_TABLE.code(scenario.queueType))
+        scenario_columns['start_time'].append(scenario.startTime)
+        scenario_columns['end_time'].append(scenario.endTime)
+        scenario_columns['points'].append(scenario.points)
+
+        scoreboard_entries = scenario.scoreboardEntries
+        if entry_counters is None and scoreboard_entries:
+            entry_counters = [counter for counter in ENTRY_COUNTERS
+                              if getattr(scoreboard_entries[0], counter) is not None]
+            entry_columns.update({counter: list() for counter in entry_counters})
+        for entry in scoreboard_entries:
+            entry_columns['scenario_index'].append(scenario_index)
+            entry_columns['career'].append(career_code(entry.character.career))
+            entry_columns['character'].append(intern_entity(entity_tables['character'], entity_names['character'],
+                                                            entry.character))
+            entry_columns['guild'].append(intern_entity(entity_tables['guild'], entity_names['guild'], entry.guild))
+            for counter in entry_counters:
+                entry_columns[counter].append(getattr(entry, counter))
+        scenario_columns['entry_offsets'].append(scenario_columns['entry_offsets'][-1] + len(scoreboard_entries))
+
+    columnar_statistics = {
+        'scenario_instance_id': np.array(scenario_columns['instance_id'], dtype='U36'),
+        'scenario_queue_type': np.array(scenario_columns['queue_type'], dtype=np.int8),
+        'scenario_start_time': np.array(scenario_columns['start_time'], dtype=np.int64),
+        'scenario_end_time': np.array(scenario_columns['end_time'], dtype=np.int64),
+        'scenario_points': np.array(scenario_columns['points'], dtype=np.int32).reshape(-1, 2),
+        'scenario_entry_offsets': np.array(scenario_columns['entry_offsets'], dtype=np.int64)
+    }
+    columnar_statistics['scenario_index'] = np.array(entry_columns.pop('scenario_index'), dtype=np.int32)
+    columnar_statistics['career'] = np.array(entry_columns.pop('career'), dtype=np.int8)
+    # Characters and guilds are only stored if any of their ids was scraped, i.e. if the field profile has them
+    for entity in INTERNED_ENTITIES:
+        entity_codes = entry_columns.pop(entity)
+        if len(entity_tables[entity]):
+            columnar_statistics[entity] = np.array(entity_codes, dtype=np.int32)
+            columnar_statistics[f'table_{entity}_id'] = entity_tables[entity].to_array()
+            columnar_statistics[f'table_{entity}_name'] = np.array(entity_names[entity], dtype=str)
+    for counter, counter_values in entry_columns.items():
+        columnar_statistics[counter] = np.array(counter_values, dtype=ENTRY_COUNTERS[counter])
+
+    return columnar_statistics
+
+
+def intern_entity(entity_table, entity_names, entity):
+    """"""
+    # A character or guild keeps the name it had in the last scenario it was seen in, the same as in the scenario
+    # statistics store
+    if entity is None or entity.id is None:
+        return NO_CODE
+    entity_code = entity_table.intern(entity.id)
+    if entity_code == len(entity_names):
+        entity_names.append(entity.name or '')
+    elif entity.name:
+        entity_names[entity_code] = entity.name
+    return entity_code
+
+
+def statistics_store_name(statistics_path):
+    """"""
+    # Name of the stores derived from a statistics file, keyed on its full path so that statistics files of the same
+    # name in other directories or in other formats don't share a store
+    statistics_path = os.path.abspath(statistics_path)
+    statistics_filename = json_records_stem(os.path.basename(statistics_path))
+    return f'{statistics_filename}_{hashlib.sha256(statistics_path.encode("utf-8")).hexdigest()[:16]}'
+
+
+def columnar_path(statistics_path, columnar_output_dir=COLUMNAR_OUTPUT_DIR):
+    """"""
+    return os.path.abspath(columnar_output_dir) + f'/{statistics_store_name(statistics_path)}.npz'
+
+
+def save_columnar_scenario_statistics(columnar_statistics, npz_path, statistics_hash):
+    """"""
+    os.makedirs(os.path.dirname(npz_path), exist_ok=True)
+    # Uncompressed, so that loading is a plain read of the arrays. The content hash of the statistics file the store
+    # was built from is stored along
+    np.savez(npz_path, **{STATISTICS_HASH_ARRAY: np.array(statistics_hash)}, **columnar_statistics)
+
+
+def load_columnar_scenario_statistics(statistics_path, columnar_output_dir=COLUMNAR_OUTPUT_DIR):
+    """"""
+    # The columnar store of a statistics file is (re)built whenever it is missing or was built from another content of
+    # the statistics file
+    npz_path = columnar_path(statistics_path, columnar_output_dir)
+    statistics_hash = hash_file(statistics_path)
+    columnar_statistics = None
+    if os.path.exists(npz_path):
+        with np.load(npz_path) as npz_file:
+            if STATISTICS_HASH_ARRAY in npz_file.files and str(npz_file[STATISTICS_HASH_ARRAY]) == statistics_hash:
+                columnar_statistics = {array_name: npz_file[array_name] for array_name in npz_file.files
+                                       if array_name != STATISTICS_HASH_ARRAY}
+    if columnar_statistics is None:
+        columnar_statistics = build_columnar_scenario_statistics(statistics_path)
+        save_columnar_scenario_statistics(columnar_statistics, npz_path, statistics_hash)
+
+    return columnar_statistics
+
+
+def main():
+    """"""
+    statistics_paths = sorted(glob.glob(os.path.abspath(SUBDIVIDED_JSON_DIR) + '/scenario_statistics_*.json*'))
+    for statistics_path in tqdm(statistics_paths):
+        npz_path = columnar_path(statistics_path)
+        save_columnar_scenario_statistics(build_columnar_scenario_statistics(statistics_path), npz_path,
+                                          hash_file(statistics_path))
+        print(f'{os.path.basename(statistics_path)} -> {npz_path} ({os.path.getsize(npz_path)} bytes)')
+
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
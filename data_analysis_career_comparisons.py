@@ -0,0 +1,35 @@
+from career_share_comparison import CAREER_COMPARISONS, compare_cached_career_shares
+from career_comparison_tables import create_table_jobs, render_tables
+from subdivide_scenario_statistics import require_partition_path
+
+SCENARIO_PARTITION = 't4_standard'
+TABLE_TITLE = "mean_{}_career-relative_in_t4_standard_scenarios_-_{}"
+TABLE_OUTDIRS = {'healer': './healer_comparison_tables_t4_standard/',
+                 'tank': './tank_comparison_tables_t4_standard/',
+                 'dd': './dd_comparison_tables_t4_standard/'}
+DISREGARD_LATE_THRESHOLD = 0.1
+DISREGARD_WORST_PERFORMANCES = False
+RR_NORMALIZATION = False
+
+
+def main():
+    """"""
+    statistics_path = require_partition_path(SCENARIO_PARTITION)
+    # Runs the healer, tank and dd comparisons on a single load of the scenario statistics
+    comparisons = {comparison_name: CAREER_COMPARISONS[comparison_name] for comparison_name in TABLE_OUTDIRS}
+    career_relatives = compare_cached_career_shares(statistics_path, comparisons, DISREGARD_LATE_THRESHOLD,
+                                                    DISREGARD_WORST_PERFORMANCES, RR_NORMALIZATION)
+
+    # Create matplotlib table of the analysed data
+    print("Creating matplotlib table plots...")
+    table_jobs = list()
+    for comparison_name, career_relative in career_relatives.items():
+        table_jobs += create_table_jobs(career_relative, comparisons[comparison_name], TABLE_TITLE,
+                                        TABLE_OUTDIRS[comparison_name], statistics_path)
+    render_tables(table_jobs)
+
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,71 +1,90 @@
-import json
-from statistics import mean
-from collections import defaultdict
-from tqdm import tqdm
+import numpy as np
+from columnar_scenario_statistics import ORDER_CAREERS, DESTRO_CAREERS, CAREERS, CAREER_CODES, CAREER_REALMS, \
+    load_columnar_scenario_statistics
+from subdivide_scenario_statistics import require_partition_path
+from scenario_statistics_store import SQLITE_STORE_FILE, load_stored_columnar_scenario_statistics
 
-SCENARIO_STATISTICS_JSON = './subdivided_scenario_statistics/scenario_statistics_t4_standard.json'
+SCENARIO_PARTITION = 't4_standard'
+# Query the scenarios of the partition from the SQLite store instead of reading the partition file, optionally only
+# those started in [START_TIME_FROM, START_TIME_TO), given as unix timestamps
+READ_FROM_SQLITE = False
+START_TIME_FROM = None
+START_TIME_TO = None
 
 
-def main():
+def count_career_wins(columnar_statistics):
     """"""
-    with open(SCENARIO_STATISTICS_JSON, 'r') as json_file:
-        scenario_statistics = json.load(json_file)
-
-    order_careers = ['SWORDMASTER', 'IRONBREAKER', 'KNIGHT', 'WHITE_LION', 'SLAYER', 'WITCH_HUNTER', 'ENGINEER',
-                     'SHADOW_WARRIOR', 'BRIGHT_WIZARD', 'ARCHMAGE', 'RUNE_PRIEST', 'WARRIOR_PRIEST']
-    destro_careers = ['BLACK_ORC', 'BLACKGUARD', 'CHOSEN', 'MARAUDER', 'CHOPPA', 'WITCH_ELF', 'MAGUS', 'SQUIG_HERDER',
-                      'SORCERER', 'SHAMAN', 'ZEALOT', 'DISCIPLE']
-
-    career_win_loss_acc = defaultdict(list)
-    order_wins = 0
-    destro_wins = 0
-
-    for instance_info in tqdm(scenario_statistics.values()):
-        # The winner is manually determined by comparing scenario points as a draw in points results in the
-        # 'winner' field being set to 0, same as when order wins.
-        # A draw is set to not influence the win/loss rate of a career
-        order_points, destro_points = instance_info['points']
-        if order_points > destro_points:
-            order_wins += 1
-            # Order won. Append 1 to order chars win rate
-            for character in instance_info['scoreboardEntries']:
-                career = character['character']['career']
-                if career in order_careers:
-                    career_win_loss_acc[career].append(1)
-                else:
-                    career_win_loss_acc[career].append(0)
-        elif destro_points > order_points:
-            destro_wins += 1
-            # Destro won. Append 1 to destro chars win rate
-            for character in instance_info['scoreboardEntries']:
-                career = character['character']['career']
-                if career in order_careers:
-                    career_win_loss_acc[career].append(0)
-                else:
-                    career_win_loss_acc[career].append(1)
-        else:
-            continue
+    # The winner is manually determined by comparing scenario points as a draw in points results in the 'winner' field
+    # being set to 0, same as when order wins. The winning realm is 0 for order, 1 for destro and -1 for a draw.
+    # A draw is set to not influence the win/loss rate of a career
+    order_points = columnar_statistics['scenario_points'][:, 0]
+    destro_points = columnar_statistics['scenario_points'][:, 1]
+    scenario_winner = np.where(order_points > destro_points, 0, np.where(destro_points > order_points, 1, -1))
 
-    total_scenarios = len(scenario_statistics)
-    order_win_ratio = round(100 * order_wins / total_scenarios, 1)
-    destro_win_ratio = round(100 * destro_wins / total_scenarios, 1)
+    entry_winner = scenario_winner[columnar_statistics['scenario_index']]
+    entry_career = columnar_statistics['career']
+    decided = entry_winner >= 0
+    won = decided & (CAREER_REALMS[entry_career] == entry_winner)
 
-    print(f"Source: {SCENARIO_STATISTICS_JSON}\n\n"
-          f"Order Win-Rate: {order_win_ratio}%\n"
-          f"Order Careers Win-Rate:")
-    for career in order_careers:
-        win_rate = round(100 * mean(career_win_loss_acc[career]), 1)
-        win_rate_diff = round(win_rate - order_win_ratio, 1)
-        win_rate_diff_str = f'+{win_rate_diff}' if win_rate_diff > 0 else str(win_rate_diff)
-        print(f"{str(career) + ':':<15}{win_rate:>5}% ({win_rate_diff_str}%)")
+    career_wins = np.bincount(entry_career[won], minlength=len(CAREERS))
+    career_games = np.bincount(entry_career[decided], minlength=len(CAREERS))
+    realm_wins = np.bincount(scenario_winner[scenario_winner >= 0], minlength=2)
+    return career_wins, career_games, realm_wins
 
-    print(f"\nDestro Win-Rate: {destro_win_ratio}%\n"
-          f"Destro Careers Win-Rate:")
-    for career in destro_careers:
-        win_rate = round(100 * mean(career_win_loss_acc[career]), 1)
-        win_rate_diff = round(win_rate - destro_win_ratio, 1)
+
+def win_rate_mean(wins, games):
+    """"""
+    # Same type as statistics.mean of the 0/1 outcomes, which returns an int for whole results (e.g. 100% prints as
+    # '100' rather than '100.0')
+    wins, games = int(wins), int(games)
+    return wins // games if wins % games == 0 else wins / games
+
+
+def create_careers_win_rate_lines(careers, career_wins, career_games, realm_win_ratio):
+    """"""
+    careers_win_rate_lines = list()
+    for career in careers:
+        career_code = CAREER_CODES[career]
+        if not career_games[career_code]:
+            careers_win_rate_lines.append(f"{str(career) + ':':<15}{'n/a':>5}")
+            continue
+        win_rate = round(100 * win_rate_mean(career_wins[career_code], career_games[career_code]), 1)
+        win_rate_diff = round(win_rate - realm_win_ratio, 1)
         win_rate_diff_str = f'+{win_rate_diff}' if win_rate_diff > 0 else str(win_rate_diff)
-        print(f"{str(career) + ':':<15}{win_rate:>5}% ({win_rate_diff_str}%)")
+        careers_win_rate_lines.append(f"{str(career) + ':':<15}{win_rate:>5}% ({win_rate_diff_str}%)")
+    return careers_win_rate_lines
+
+
+def create_career_win_rate_report(columnar_statistics, source):
+    """"""
+    career_wins, career_games, (order_wins, destro_wins) = count_career_wins(columnar_statistics)
+
+    total_scenarios = len(columnar_statistics['scenario_points'])
+    if not total_scenarios:
+        return f"Source: {source}\n\nNo scenarios"
+    order_win_ratio = round(100 * int(order_wins) / total_scenarios, 1)
+    destro_win_ratio = round(100 * int(destro_wins) / total_scenarios, 1)
+
+    report_lines = [f"Source: {source}\n",
+                    f"Order Win-Rate: {order_win_ratio}%",
+                    f"Order Careers Win-Rate:"]
+    report_lines += create_careers_win_rate_lines(ORDER_CAREERS, career_wins, career_games, order_win_ratio)
+    report_lines += [f"\nDestro Win-Rate: {destro_win_ratio}%",
+                     f"Destro Careers Win-Rate:"]
+    report_lines += create_careers_win_rate_lines(DESTRO_CAREERS, career_wins, career_games, destro_win_ratio)
+    return '\n'.join(report_lines)
+
+
+def main():
+    """"""
+    if READ_FROM_SQLITE:
+        columnar_statistics = load_stored_columnar_scenario_statistics(SCENARIO_PARTITION, SQLITE_STORE_FILE,
+                                                                       START_TIME_FROM, START_TIME_TO)
+        source = f'{SQLITE_STORE_FILE} ({SCENARIO_PARTITION})'
+    else:
+        source = require_partition_path(SCENARIO_PARTITION)
+        columnar_statistics = load_columnar_scenario_statistics(source)
+    print(create_career_win_rate_report(columnar_statistics, source))
 
     print('\nfin')
 
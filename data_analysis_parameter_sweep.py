@@ -0,0 +1,63 @@
+import os
+import csv
+from career_share_comparison import CAREER_COMPARISONS, load_comparison_statistics, compare_career_shares_grid
+from career_comparison_tables import div_zero
+from subdivide_scenario_statistics import require_partition_path
+
+SCENARIO_PARTITION = 't4_standard'
+SWEEP_OUTPUT_CSV = './parameter_sweep_t4_standard.csv'
+COMPARISON_NAMES = ['healer', 'tank', 'dd']
+SWEEP_DISREGARD_LATE_THRESHOLDS = [0.05, 0.075, 0.1, 0.125, 0.15, 0.175, 0.2, 0.225, 0.25, 0.3]
+SWEEP_DISREGARD_WORST_PERFORMANCES = [False]
+SWEEP_RR_NORMALIZATIONS = [False, True]
+
+SWEEP_CSV_COLUMNS = ['source', 'comparison', 'metric', 'realm', 'career', 'paired_career', 'disregard_late_threshold',
+                     'disregard_worst_performances', 'rr_normalization', 'own', 'other', 'relation', 'datapoints']
+
+
+def create_sweep_rows(grid_career_relatives, source):
+    """"""
+    # One row per parameter combination, comparison, metric and career pairing. Relations of pairings without
+    # datapoints are left empty, the same as their own and other values
+    sweep_rows = list()
+    for (disregard_late_threshold, disregard_worst_performances, rr_normalization), career_relatives \
+            in grid_career_relatives.items():
+        for comparison_name, career_relative in career_relatives.items():
+            for description, career_relative_stat in career_relative.items():
+                for realm, realm_career_relative_stat in career_relative_stat.items():
+                    for career_x, paired_career_stats in realm_career_relative_stat.items():
+                        for career_y, pair_stat in paired_career_stats.items():
+                            own_stat, other_stat = pair_stat['own'], pair_stat['other']
+                            relation = None
+                            if own_stat is not None and other_stat is not None:
+                                relation = round(div_zero(own_stat, other_stat), 2)
+                            sweep_rows.append([source, comparison_name, description, realm, career_x, career_y,
+                                               disregard_late_threshold, disregard_worst_performances,
+                                               rr_normalization, own_stat, other_stat, relation,
+                                               pair_stat['datapoints']])
+    return sweep_rows
+
+
+def main():
+    """"""
+    statistics_path = require_partition_path(SCENARIO_PARTITION)
+    # The statistics are loaded once and the whole parameter grid is evaluated in a single pass over them, sharing the
+    # per-entry work of all grid points
+    columnar_statistics = load_comparison_statistics(statistics_path)
+    comparisons = {comparison_name: CAREER_COMPARISONS[comparison_name] for comparison_name in COMPARISON_NAMES}
+    grid_career_relatives = compare_career_shares_grid(columnar_statistics, comparisons,
+                                                       SWEEP_DISREGARD_LATE_THRESHOLDS,
+                                                       SWEEP_DISREGARD_WORST_PERFORMANCES, SWEEP_RR_NORMALIZATIONS)
+    print(f"Evaluated {len(grid_career_relatives)} parameter combinations")
+
+    with open(SWEEP_OUTPUT_CSV, 'w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(SWEEP_CSV_COLUMNS)
+        csv_writer.writerows(create_sweep_rows(grid_career_relatives, statistics_path))
+
+    print(f"Sweep results written to {os.path.abspath(SWEEP_OUTPUT_CSV)}")
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,54 @@
-import json
-from tqdm import tqdm
+from columnar_scenario_statistics import load_columnar_scenario_statistics
+from subdivide_scenario_statistics import require_partition_path
+from scenario_statistics_store import SQLITE_STORE_FILE, load_stored_columnar_scenario_statistics
 
-SCENARIO_STATISTICS_JSON = './subdivided_scenario_statistics/scenario_statistics_t4_standard.json'
+SCENARIO_PARTITION = 't4_standard'
+# Query the scenarios of the partition from the SQLite store instead of reading the partition file, optionally only
+# those started in [START_TIME_FROM, START_TIME_TO), given as unix timestamps
+READ_FROM_SQLITE = False
+START_TIME_FROM = None
+START_TIME_TO = None
 
 
-def main():
+def create_realm_win_rate_report(columnar_statistics, source):
     """"""
-    with open(SCENARIO_STATISTICS_JSON, 'r') as json_file:
-        scenario_statistics = json.load(json_file)
-
-    order_wins = 0
-    total_order_points = 0
-    destro_wins = 0
-    total_destro_points = 0
-    draws = 0
-
-    for instance_info in tqdm(scenario_statistics.values()):
-        # The winner is manually determined by comparing scenario points as a draw in points results in the
-        # 'winner' field being set to 0, same as when order wins
-        order_points, destro_points = instance_info['points']
-        if order_points > destro_points:
-            order_wins += 1
-        elif destro_points > order_points:
-            destro_wins += 1
-        else:
-            draws += 1
-        total_order_points += order_points
-        total_destro_points += destro_points
-
-    total_scenarios = len(scenario_statistics)
+    # The winner is manually determined by comparing scenario points as a draw in points results in the 'winner' field
+    # being set to 0, same as when order wins
+    order_points = columnar_statistics['scenario_points'][:, 0].astype('int64')
+    destro_points = columnar_statistics['scenario_points'][:, 1].astype('int64')
+    order_wins = int((order_points > destro_points).sum())
+    destro_wins = int((destro_points > order_points).sum())
+    draws = int((order_points == destro_points).sum())
+    total_order_points = int(order_points.sum())
+    total_destro_points = int(destro_points.sum())
+
+    total_scenarios = len(columnar_statistics['scenario_points'])
+    if not total_scenarios:
+        return f"Source: {source}\n\n{'Total Scenarios:':<16}{total_scenarios:>8}\n"
     order_win_ratio = round(100 * order_wins / total_scenarios, 1)
     destro_win_ratio = round(100 * destro_wins / total_scenarios, 1)
     draw_ratio = round(100 * draws / total_scenarios, 1)
 
-    print(
-        f"Source: {SCENARIO_STATISTICS_JSON}\n\n"
+    return (
+        f"Source: {source}\n\n"
         f"{'Total Scenarios:':<16}{total_scenarios:>8}\n"
         f"{'Order Wins:':<16}{order_wins:>8} ({order_win_ratio}%) [total points: {total_order_points}]\n"
         f"{'Destro Wins:':<16}{destro_wins:>8} ({destro_win_ratio}%) [total points: {total_destro_points}]\n"
         f"{'Draws:':<16}{draws:>8} ({draw_ratio}%)\n"
     )
 
+
+def main():
+    """"""
+    if READ_FROM_SQLITE:
+        columnar_statistics = load_stored_columnar_scenario_statistics(SCENARIO_PARTITION, SQLITE_STORE_FILE,
+                                                                       START_TIME_FROM, START_TIME_TO)
+        source = f'{SQLITE_STORE_FILE} ({SCENARIO_PARTITION})'
+    else:
+        source = require_partition_path(SCENARIO_PARTITION)
+        columnar_statistics = load_columnar_scenario_statistics(source)
+    print(create_realm_win_rate_report(columnar_statistics, source))
+
     print('fin')
 
 
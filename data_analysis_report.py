@@ -0,0 +1,84 @@
+import os
+from multiprocessing import Pool
+from subdivide_scenario_statistics import PARTITION_NAMES, find_partition_path
+from career_share_comparison import CAREER_COMPARISONS, load_comparison_statistics, compare_cached_career_shares
+from career_comparison_tables import create_table_jobs, render_tables
+from data_analysis_realm_win_rate import create_realm_win_rate_report
+from data_analysis_career_win_rate import create_career_win_rate_report
+
+SUBDIVIDED_JSON_DIR = './subdivided_scenario_statistics/'
+REPORT_OUTPUT_FILE = './data_analysis_report.txt'
+ANALYSIS_NAMES = ['realm_win_rate', 'career_win_rate', 'dd_comparison', 'healer_comparison', 'tank_comparison']
+PROCESS_COUNT = os.cpu_count()
+TABLE_TITLE = "mean_{{}}_career-relative_in_{}_scenarios_-_{{}}"
+TABLE_OUTDIR = './{}_comparison_tables_{}/'
+DISREGARD_LATE_THRESHOLD = 0.1
+DISREGARD_WORST_PERFORMANCES = False
+RR_NORMALIZATION = False
+
+TEXT_REPORTS = {'realm_win_rate': create_realm_win_rate_report,
+                'career_win_rate': create_career_win_rate_report}
+
+
+def analyse_partition(partition_analysis):
+    """"""
+    partition_name, analysis_names = partition_analysis
+    statistics_path = find_partition_path(partition_name, SUBDIVIDED_JSON_DIR)
+
+    # The partition is loaded once and shared by all analyses of it. The comparisons are computed in a single pass
+    columnar_statistics = load_comparison_statistics(statistics_path)
+    # Partitions the subdivider found no scenarios for are written nonetheless, there is nothing to analyse in them
+    if not len(columnar_statistics['scenario_instance_id']):
+        return partition_name, [f"Source: {statistics_path}\n\nNo scenarios\n"], list()
+    reports = [TEXT_REPORTS[analysis_name](columnar_statistics, statistics_path)
+               for analysis_name in analysis_names if analysis_name in TEXT_REPORTS]
+
+    comparisons = {comparison_name: comparison for comparison_name, comparison in CAREER_COMPARISONS.items()
+                   if f'{comparison_name}_comparison' in analysis_names}
+    career_relatives = compare_cached_career_shares(statistics_path, comparisons, DISREGARD_LATE_THRESHOLD,
+                                                    DISREGARD_WORST_PERFORMANCES, RR_NORMALIZATION,
+                                                    columnar_statistics)
+    table_jobs = list()
+    for comparison_name, career_relative in career_relatives.items():
+        table_outdir = TABLE_OUTDIR.format(comparison_name, partition_name)
+        table_jobs += create_table_jobs(career_relative, comparisons[comparison_name],
+                                        TABLE_TITLE.format(partition_name), table_outdir, statistics_path)
+        reports.append(f"{comparison_name} comparison tables: {os.path.abspath(table_outdir)}\n")
+
+    return partition_name, reports, table_jobs
+
+
+def main():
+    """"""
+    # Partitions that were not subdivided are skipped. The largest partitions are started first, so that the workers
+    # finish at about the same time
+    partition_names = [partition_name for partition_name in PARTITION_NAMES
+                       if find_partition_path(partition_name, SUBDIVIDED_JSON_DIR)]
+    partition_names.sort(key=lambda name: os.path.getsize(find_partition_path(name, SUBDIVIDED_JSON_DIR)),
+                         reverse=True)
+
+    # The tables of all partitions are rendered by the same pool once the partitions are analysed
+    partition_reports = dict()
+    table_jobs = list()
+    with Pool(PROCESS_COUNT) as pool:
+        for partition_name, reports, partition_table_jobs in pool.imap_unordered(
+                analyse_partition, [(partition_name, ANALYSIS_NAMES) for partition_name in partition_names]):
+            partition_reports[partition_name] = reports
+            table_jobs += partition_table_jobs
+            print(f"Analysed {partition_name}")
+
+        print("Creating matplotlib table plots...")
+        render_tables(table_jobs, pool=pool)
+
+    with open(REPORT_OUTPUT_FILE, 'w') as report_file:
+        for partition_name in PARTITION_NAMES:
+            if partition_name in partition_reports:
+                report_file.write(f"===== {partition_name} =====\n\n" + '\n'.join(partition_reports[partition_name])
+                                  + '\n')
+
+    print(f"Report written to {os.path.abspath(REPORT_OUTPUT_FILE)}")
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
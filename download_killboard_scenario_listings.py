@@ -1,62 +1,219 @@
+import os
 import math
-import json
-import requests
 from tqdm import tqdm
+from killboard_api_client import API_URL, CONCURRENCY_LIMIT, REQUESTS_PER_SECOND, AsyncGraphQLClient, \
+    GraphQLRequestError, iter_unordered, run_until_complete
+from scenario_statistics_stream import load_json_records, write_json_records, resolve_json_records_path
+from scenario_statistics_store import SQLITE_STORE_FILE, store_scenario_listings, load_stored_scenario_listings
 
-API_URL = 'https://production-api.waremu.com/graphql'
-JSON_OUTPUT_FILE = './ror-killboard_scenario_listings.json'
+JSON_OUTPUT_FILE = './ror-killboard_scenario_listings.jsonl.gz'
+INCREMENTAL_SYNC = True
+# Store the listings in the SQLite store instead of the listings file
+STORE_IN_SQLITE = False
+SCENARIO_LIST_PAGE_SIZE = 50
+SHIFT_RECOVERY_ROUNDS = 3
+SCENARIO_LIST_QUERY = 'query GetScenarioList($characterId: ID, $guildId: ID, $queueType: ScenarioQueueType, $first: Int, $last: Int, $before: String, $after: String) {\n  scenarios(\n    characterId: $characterId\n    guildId: $guildId\n    queueType: $queueType\n    first: $first\n    last: $last\n    before: $before\n    after: $after\n  ) {\n    totalCount\n    nodes {\n      instanceId\n      scenarioId\n      startTime\n      endTime\n      winner\n      points\n      __typename\n    }\n    pageInfo {\n      hasNextPage\n      endCursor\n      hasPreviousPage\n      startCursor\n      __typename\n    }\n    __typename\n  }\n}'
 
 
-def main():
+def create_scenario_list_request(after=None):
     """"""
-    json_headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:99.0) Gecko/20100101 Firefox/99.0',
-        'Accept': '*/*',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip',
-        'Referer': 'https://killboard.returnofreckoning.com/',
-        'Content-Type': 'application/json',
-        'Origin': 'https://killboard.returnofreckoning.com',
-        'Content-Length': '702',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'cross-site',
-        'TE': 'trailers'
-    }
-
     json_request = {
         'operationName': 'GetScenarioList',
         'variables': {
-            'first': 50,
-            # 'after': '12345'
+            'first': SCENARIO_LIST_PAGE_SIZE
         },
-        'query': 'query GetScenarioList($characterId: ID, $guildId: ID, $queueType: ScenarioQueueType, $first: Int, $last: Int, $before: String, $after: String) {\n  scenarios(\n    characterId: $characterId\n    guildId: $guildId\n    queueType: $queueType\n    first: $first\n    last: $last\n    before: $before\n    after: $after\n  ) {\n    totalCount\n    nodes {\n      instanceId\n      scenarioId\n      startTime\n      endTime\n      winner\n      points\n      __typename\n    }\n    pageInfo {\n      hasNextPage\n      endCursor\n      hasPreviousPage\n      startCursor\n      __typename\n    }\n    __typename\n  }\n}'
+        'query': SCENARIO_LIST_QUERY
     }
+    if after is not None:
+        json_request['variables']['after'] = after
+
+    return json_request
+
+
+def scenario_list_page_cursor(total_scenarios_count, request_counter):
+    """"""
+    # The first page is requested without cursor and holds the newest scenarios
+    if request_counter == 0:
+        return None
+    return str(total_scenarios_count - request_counter * SCENARIO_LIST_PAGE_SIZE)
+
+
+def scenario_list_page_size(total_scenarios_count, request_counter):
+    """"""
+    return max(0, min(SCENARIO_LIST_PAGE_SIZE, total_scenarios_count - request_counter * SCENARIO_LIST_PAGE_SIZE))
+
+
+async def fetch_scenario_list_page(client, after=None):
+    """"""
+    # Failed pages are collected by the caller and requested again
+    try:
+        response_json = await client.post(create_scenario_list_request(after))
+        return response_json['data']['scenarios']
+    except (GraphQLRequestError, KeyError, TypeError) as e:
+        print(f"Error occured with scenario list page after {after}: {e}.")
+        return None
+
+
+async def fetch_scenario_list_pages(client, total_scenarios_count, request_counters, concurrency_limit):
+    """"""
+    async def fetch_page(request_counter):
+        after = scenario_list_page_cursor(total_scenarios_count, request_counter)
+        return request_counter, await fetch_scenario_list_page(client, after)
+
+    page_nodes = dict()
+    progress_bar = tqdm(total=len(request_counters))
+    async for request_counter, scenario_list_page in iter_unordered(fetch_page, request_counters, concurrency_limit):
+        progress_bar.update()
+        if scenario_list_page is not None:
+            page_nodes[request_counter] = scenario_list_page['nodes']
+    progress_bar.close()
+
+    return page_nodes
+
+
+def find_shifted_pages(page_nodes, total_scenarios_count):
+    """"""
+    # The cursors of all pages are derived from the totalCount at the start of the scrape. A page that holds fewer
+    # scenarios than its cursor range or that shares scenarios with another page has shifted in between requests
+    shifted_request_counters = set()
+    scenario_pages = dict()
+    for request_counter, nodes in page_nodes.items():
+        if len(nodes) != scenario_list_page_size(total_scenarios_count, request_counter):
+            shifted_request_counters.add(request_counter)
+        for scenario_instance in nodes:
+            other_request_counter = scenario_pages.setdefault(scenario_instance['instanceId'], request_counter)
+            if other_request_counter != request_counter:
+                shifted_request_counters.update((request_counter, other_request_counter))
+
+    return shifted_request_counters
 
-    response = requests.post(API_URL, json=json_request, headers=json_headers)
-    response_json = response.json()
 
+def merge_scenario_list_pages(page_nodes, previous_scenario_listings=None):
+    """"""
+    # Merge the pages from newest to oldest to keep the listings ordered. Scenarios that appear on several pages are
+    # de-duplicated by their instanceId
     scenario_listings = dict()
-    for scenario_instance in response_json['data']['scenarios']['nodes']:
-        scenario_listings[scenario_instance['instanceId']] = scenario_instance
+    for request_counter in sorted(page_nodes):
+        for scenario_instance in page_nodes[request_counter]:
+            scenario_listings.setdefault(scenario_instance['instanceId'], scenario_instance)
+    for scenario_id, scenario_instance in (previous_scenario_listings or dict()).items():
+        scenario_listings.setdefault(scenario_id, scenario_instance)
+
+    return scenario_listings
+
+
+async def download_scenario_listings(api_url=API_URL, concurrency_limit=CONCURRENCY_LIMIT,
+                                     requests_per_second=REQUESTS_PER_SECOND):
+    """"""
+    async with AsyncGraphQLClient(api_url, concurrency_limit, requests_per_second) as client:
+        scenario_list_page = await fetch_scenario_list_page(client)
+        if scenario_list_page is None:
+            raise GraphQLRequestError('The first scenario list page could not be fetched')
+        total_scenarios_count = scenario_list_page['totalCount']
+        page_nodes = {0: scenario_list_page['nodes']}
+        scenario_listings = dict()
+
+        for recovery_round in range(SHIFT_RECOVERY_ROUNDS + 1):
+            # The cursor space is known up front from the totalCount, so all pages are fetched concurrently
+            total_requests_count = math.ceil(total_scenarios_count / SCENARIO_LIST_PAGE_SIZE)
+            request_counters = [request_counter for request_counter in range(total_requests_count)
+                                if request_counter not in page_nodes]
+            page_nodes.update(await fetch_scenario_list_pages(client, total_scenarios_count, request_counters,
+                                                              concurrency_limit))
+
+            # Pages that failed or shifted in between requests are requested once more
+            refetch_request_counters = set(range(total_requests_count)) - set(page_nodes)
+            refetch_request_counters |= find_shifted_pages(page_nodes, total_scenarios_count)
+            if refetch_request_counters:
+                print(f'Refetching failed or shifted scenario list pages: {len(refetch_request_counters)}')
+                page_nodes.update(await fetch_scenario_list_pages(client, total_scenarios_count,
+                                                                  sorted(refetch_request_counters), concurrency_limit))
+            scenario_listings = merge_scenario_list_pages(page_nodes, scenario_listings)
+
+            # Scenarios that finished while the scrape was running are not covered by the cursors of the initial
+            # totalCount. Pick them up by syncing the newest pages against the scraped listings
+            new_scenario_listings, current_scenarios_count = \
+                await sync_scenario_listings_with_client(client, scenario_listings)
+            scenario_listings = {**new_scenario_listings, **scenario_listings}
+
+            # If scenarios are still missing, some were inserted in between the existing ones and shifted the pages
+            # beneath them. Request all pages again with cursors derived from the current totalCount
+            if len(scenario_listings) >= current_scenarios_count or recovery_round == SHIFT_RECOVERY_ROUNDS:
+                break
+            print(f'Scenario list pages shifted while scraping, refetching with totalCount {current_scenarios_count}')
+            total_scenarios_count = current_scenarios_count
+            page_nodes = dict()
+
+    if len(scenario_listings) < current_scenarios_count:
+        print(f'Warning: {current_scenarios_count - len(scenario_listings)} scenario listings could not be scraped')
+
+    return scenario_listings
 
-    total_scenarios_count = response_json['data']['scenarios']['totalCount']
-    total_requests_count = math.ceil(total_scenarios_count / 50)
 
-    for request_counter in tqdm(range(1, total_requests_count)):
-        scenario_after_idx = total_scenarios_count - request_counter * 50
-        json_request['variables']['after'] = str(scenario_after_idx)
+async def sync_scenario_listings_with_client(client, known_scenario_listings):
+    """"""
+    # The listings are paged from newest to oldest. As soon as a page consists solely of already known scenarios, all
+    # older pages are known as well and the sync can stop
+    new_scenario_listings = dict()
+    scenario_list_page = await fetch_scenario_list_page(client)
+    if scenario_list_page is None:
+        raise GraphQLRequestError('The first scenario list page could not be fetched')
+    total_scenarios_count = scenario_list_page['totalCount']
+    total_requests_count = math.ceil(total_scenarios_count / SCENARIO_LIST_PAGE_SIZE)
+    request_counter = 1
+
+    while True:
+        page_has_new_scenarios = False
+        for scenario_instance in scenario_list_page['nodes']:
+            if scenario_instance['instanceId'] not in known_scenario_listings:
+                new_scenario_listings[scenario_instance['instanceId']] = scenario_instance
+                page_has_new_scenarios = True
+
+        if not page_has_new_scenarios or request_counter >= total_requests_count:
+            break
+
+        scenario_after_idx = scenario_list_page_cursor(total_scenarios_count, request_counter)
+        scenario_list_page = await fetch_scenario_list_page(client, scenario_after_idx)
+        request_counter += 1
+        # Stopping at a page that could not be fetched would leave a gap between the synced and the known listings
+        # that no later sync fills, as the sync stops at the first page of known scenarios
+        if scenario_list_page is None:
+            raise GraphQLRequestError(f'Scenario list page {request_counter} could not be fetched')
+
+    print(f'Scenario listing pages synced: {request_counter}')
+    return new_scenario_listings, total_scenarios_count
+
 
-        response = requests.post(API_URL, json=json_request, headers=json_headers)
-        response_json = response.json()
+async def sync_scenario_listings(known_scenario_listings, api_url=API_URL, requests_per_second=REQUESTS_PER_SECOND):
+    """"""
+    async with AsyncGraphQLClient(api_url, 1, requests_per_second) as client:
+        new_scenario_listings, _ = await sync_scenario_listings_with_client(client, known_scenario_listings)
+        return new_scenario_listings
+
+
+def main():
+    """"""
+    # Known listings are read in whichever format they were stored in and written back in the same format
+    output_path = resolve_json_records_path(JSON_OUTPUT_FILE)
+    known_scenario_listings = dict()
+    if INCREMENTAL_SYNC and STORE_IN_SQLITE:
+        known_scenario_listings = load_stored_scenario_listings(SQLITE_STORE_FILE)
+    elif INCREMENTAL_SYNC and os.path.exists(output_path):
+        known_scenario_listings = load_json_records(output_path)
 
-        for scenario_instance in response_json['data']['scenarios']['nodes']:
-            scenario_listings[scenario_instance['instanceId']] = scenario_instance
+    if known_scenario_listings:
+        new_scenario_listings = run_until_complete(sync_scenario_listings(known_scenario_listings))
+        # Keep the listings ordered from newest to oldest by placing the delta in front of the known listings
+        scenario_listings = {**new_scenario_listings, **known_scenario_listings}
+        print(f'New scenario listings scraped: {len(new_scenario_listings)}')
+    else:
+        scenario_listings = run_until_complete(download_scenario_listings())
 
-    with open(JSON_OUTPUT_FILE, 'w') as out_file:
-        json.dump(scenario_listings, out_file)
+    # The store only ever adds listings, as those of ended scenarios can't change anymore
+    if STORE_IN_SQLITE:
+        store_scenario_listings(scenario_listings, SQLITE_STORE_FILE)
+    else:
+        write_json_records(output_path, scenario_listings)
 
     print(f'Scenario listings scraped: {len(scenario_listings)}')
     print('fin')
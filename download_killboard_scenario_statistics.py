@@ -1,60 +1,331 @@
-import json
+import os
 import requests
 from tqdm import tqdm
+from json_backend import json_backend, loads, dumps
+from killboard_api_client import API_URL, JSON_HEADERS, CONCURRENCY_LIMIT, REQUESTS_PER_SECOND, AsyncGraphQLClient, \
+    GraphQLRequestError, GraphQLRetriesExhaustedError, iter_unordered, run_until_complete
+from killboard_field_profiles import FIELD_PROFILES, build_selection
+from scenario_statistics_stream import open_text_file, is_json_lines, iter_jsonl_items, iter_json_records, \
+    resolve_json_records_path, require_json_records_path
+from scenario_statistics_store import SQLITE_STORE_FILE, store_scenario_statistics, load_stored_scenario_listings, \
+    read_stored_scoreboard_ids
 
-API_URL = 'https://production-api.waremu.com/graphql'
-SCENARIO_LISTINGS_JSON_FILE = './ror-killboard_scenario_listings.json'
-JSON_OUTPUT_FILE = './ror-killboard_scenario_statistics.json'
+SCENARIO_LISTINGS_JSON_FILE = './ror-killboard_scenario_listings.jsonl.gz'
+JSON_OUTPUT_FILE = './ror-killboard_scenario_statistics.jsonl.gz'
+JOURNAL_FILE = './ror-killboard_scenario_statistics.journal.jsonl'
+MERGE_MARKER_FILE = './ror-killboard_scenario_statistics.merge'
+RESUME_FROM_JOURNAL = True
+DELTA_FETCH = True
+RETRY_QUEUE_ROUNDS = 2
+BATCH_SIZE = 10
+FIELD_PROFILE = 'full'
+# Store the statistics in the SQLite store instead of the statistics file, taking the listings from the store as well
+STORE_IN_SQLITE = False
+FETCH_FAILED = object()
+SCENARIO_INFO_SELECTION = build_selection(FIELD_PROFILES[FIELD_PROFILE])
+SCENARIO_INFO_QUERY = 'query GetScenarioInfo($id: ID) {\n  scenario(id: $id) ' + SCENARIO_INFO_SELECTION + '\n}'
 
 
-def main():
+def create_scenario_info_request(scenario_id):
     """"""
-    with open(SCENARIO_LISTINGS_JSON_FILE, 'r') as json_file:
-        scenario_listings = json.load(json_file)
-
-    json_headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:99.0) Gecko/20100101 Firefox/99.0',
-        'Accept': '*/*',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip',
-        'Referer': 'https://killboard.returnofreckoning.com/',
-        'Content-Type': 'application/json',
-        'Origin': 'https://killboard.returnofreckoning.com',
-        'Content-Length': '1024',
-        'DNT': '1',
-        'Connection': 'keep-alive',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'cross-site',
-        'TE': 'trailers'
-    }
-
-    json_request = {
+    return {
         'operationName': 'GetScenarioInfo',
         'variables': {
-            'id': None
+            'id': scenario_id
         },
-        'query': 'query GetScenarioInfo($id: ID) {\n  scenario(id: $id) {\n    instanceId\n    scenarioId\n    startTime\n    endTime\n    winner\n    points\n    queueType\n    scoreboardEntries {\n      character {\n        id\n        name\n        career\n        __typename\n      }\n      guild {\n        id\n        name\n        heraldry {\n          emblem\n          pattern\n          color1\n          color2\n          shape\n          __typename\n        }\n        __typename\n      }\n      team\n      level\n      renownRank\n      quitter\n      protection\n      kills\n      deathBlows\n      deaths\n      damage\n      healing\n      objectiveScore\n      killsSolo\n      killDamage\n      healingSelf\n      healingOthers\n      protectionSelf\n      protectionOthers\n      damageReceived\n      resurrectionsDone\n      healingReceived\n      protectionReceived\n      __typename\n    }\n    __typename\n  }\n}'
+        'query': SCENARIO_INFO_QUERY
     }
 
-    scenario_statistics = dict()
 
-    for scenario_id in tqdm(scenario_listings.keys()):
-        json_request['variables']['id'] = scenario_id
+def create_scenario_info_batch_request(scenario_ids):
+    """"""
+    # One aliased scenario field per instanceId, all sharing the selection set through a fragment
+    query_variables = ', '.join(f'$id{idx}: ID' for idx in range(len(scenario_ids)))
+    query_fields = ''.join(f'\n  s{idx}: scenario(id: $id{idx}) {{\n    ...ScenarioInfo\n  }}'
+                           for idx in range(len(scenario_ids)))
+    return {
+        'operationName': 'GetScenarioInfoBatch',
+        'variables': {f'id{idx}': scenario_id for idx, scenario_id in enumerate(scenario_ids)},
+        'query': f'query GetScenarioInfoBatch({query_variables}) {{{query_fields}\n}}\n\n'
+                 f'fragment ScenarioInfo on Scenario {SCENARIO_INFO_SELECTION}'
+    }
+
+
+async def fetch_scenario_info(client, scenario_id):
+    """"""
+    try:
+        response_json = await client.post(create_scenario_info_request(scenario_id))
+        return scenario_id, response_json['data']['scenario']
+    except (GraphQLRequestError, KeyError, TypeError) as e:
+        print(f"Error occured with scenario id {scenario_id}: {e}.")
+        return scenario_id, FETCH_FAILED
+
+
+async def fetch_scenario_info_batch(client, scenario_ids):
+    """"""
+    if len(scenario_ids) == 1:
+        return [await fetch_scenario_info(client, scenario_ids[0])]
+
+    try:
+        response_json = await client.post(create_scenario_info_batch_request(scenario_ids))
+        if response_json.get('errors'):
+            raise GraphQLRequestError(response_json['errors'][0].get('message'))
+        return [(scenario_id, response_json['data'][f's{idx}']) for idx, scenario_id in enumerate(scenario_ids)]
+    except GraphQLRetriesExhaustedError as e:
+        # The API itself is unavailable, smaller batches won't fare any better
+        print(f"Error occured with batch of {len(scenario_ids)} scenarios: {e}.")
+        return [(scenario_id, FETCH_FAILED) for scenario_id in scenario_ids]
+    except (GraphQLRequestError, KeyError, TypeError):
+        # Fall back to smaller batches, so that an oversized query or a single broken scenario doesn't fail the batch
+        split_idx = len(scenario_ids) // 2
+        return (await fetch_scenario_info_batch(client, scenario_ids[:split_idx]) +
+                await fetch_scenario_info_batch(client, scenario_ids[split_idx:]))
+
+
+async def iter_scenario_statistics(scenario_ids, api_url=API_URL, concurrency_limit=CONCURRENCY_LIMIT,
+                                   requests_per_second=REQUESTS_PER_SECOND, batch_size=BATCH_SIZE):
+    """"""
+    async with AsyncGraphQLClient(api_url, concurrency_limit, requests_per_second) as client:
+        # Scenarios that still fail after the retries of the client are collected in a retry queue and requested again
+        # once all other scenarios are done, when a temporary outage of the API has hopefully passed
+        retry_queue = scenario_ids
+        for retry_round in range(RETRY_QUEUE_ROUNDS + 1):
+            if retry_round > 0:
+                print(f'Retrying failed scenarios: {len(retry_queue)}')
+            failed_scenario_ids = list()
+            scenario_id_batches = [retry_queue[idx:idx + batch_size] for idx in range(0, len(retry_queue), batch_size)]
+            async for batch_results in iter_unordered(
+                    lambda scenario_id_batch: fetch_scenario_info_batch(client, scenario_id_batch),
+                    scenario_id_batches, concurrency_limit):
+                for scenario_id, scenario_info in batch_results:
+                    if scenario_info is FETCH_FAILED:
+                        failed_scenario_ids.append(scenario_id)
+                        continue
+                    yield scenario_id, scenario_info
+            retry_queue = failed_scenario_ids
+            if not retry_queue:
+                break
+
+    if retry_queue:
+        print(f'Scenarios failed and left for the next run: {len(retry_queue)}')
+
+
+async def download_scenario_statistics(scenario_ids, api_url=API_URL, concurrency_limit=CONCURRENCY_LIMIT,
+                                       requests_per_second=REQUESTS_PER_SECOND, batch_size=BATCH_SIZE):
+    """"""
+    scenario_infos = dict()
+    async for scenario_id, scenario_info in iter_scenario_statistics(scenario_ids, api_url, concurrency_limit,
+                                                                     requests_per_second, batch_size):
+        scenario_infos[scenario_id] = scenario_info
+
+    # Responses arrive in completion order. Restore the order of the scenario listings to keep the output unchanged
+    return {scenario_id: scenario_infos[scenario_id] for scenario_id in scenario_ids if scenario_id in scenario_infos}
+
+
+async def journal_scenario_statistics(scenario_ids, journal_path, api_url=API_URL,
+                                      concurrency_limit=CONCURRENCY_LIMIT, requests_per_second=REQUESTS_PER_SECOND,
+                                      batch_size=BATCH_SIZE):
+    """"""
+    journaled_count = 0
+    with open(journal_path, 'a', encoding='utf-8') as journal_file:
+        progress_bar = tqdm(total=len(scenario_ids))
+        async for scenario_id, scenario_info in iter_scenario_statistics(scenario_ids, api_url, concurrency_limit,
+                                                                         requests_per_second, batch_size):
+            progress_bar.update()
+            # Scenarios unknown to the API are not journaled, so that a resumed scrape asks for them again
+            if scenario_info is None:
+                continue
+            # Flush every record so that a crash or interrupt loses at most the requests that are still in flight
+            journal_file.write(dumps(scenario_info) + '\n')
+            journal_file.flush()
+            journaled_count += 1
+        progress_bar.close()
+
+    return journaled_count
+
+
+def repair_journal(journal_path):
+    """"""
+    # An interrupted write can leave a partial last line behind that would corrupt the next appended record. Search
+    # backwards from the end of the journal for the last complete line instead of reading the whole journal
+    with open(journal_path, 'rb+') as journal_file:
+        position = journal_file.seek(0, os.SEEK_END)
+        while position > 0:
+            block_start = max(0, position - 65536)
+            journal_file.seek(block_start)
+            block = journal_file.read(position - block_start)
+            last_newline = block.rfind(b'\n')
+            if last_newline != -1:
+                journal_file.truncate(block_start + last_newline + 1)
+                return
+            position = block_start
+        journal_file.truncate(0)
+
+
+def iter_journal(journal_path):
+    """"""
+    with open(journal_path, 'r', encoding='utf-8') as journal_file:
+        for line in journal_file:
+            yield line.rstrip('\n')
+
+
+def read_journaled_scenario_ids(journal_path):
+    """"""
+    return {loads(line)['instanceId'] for line in iter_journal(journal_path)}
 
+
+def write_journal_records(journal_path, out_file, written_scenario_ids, json_lines=False):
+    """"""
+    # Stream the journal into a JSON object or JSON lines one record at a time. Only the instanceIds are kept in memory
+    # to drop records that were journaled twice or that are already part of the output
+    written_count = 0
+    for line in iter_journal(journal_path):
+        scenario_id = loads(line)['instanceId']
+        if scenario_id in written_scenario_ids:
+            continue
+        if json_lines:
+            out_file.write(line + '\n')
+        else:
+            separator = json_backend.item_separator if written_scenario_ids else ''
+            out_file.write(f'{separator}{dumps(scenario_id)}{json_backend.key_separator}{line}')
+        written_scenario_ids.add(scenario_id)
+        written_count += 1
+
+    return written_count
+
+
+def compact_journal(journal_path, output_path):
+    """"""
+    # The output is written to a temporary file first so that an interrupted compaction leaves both the journal and a
+    # previous output intact. The temporary file keeps the extensions of the output to be written in the same format
+    output_dir, output_filename = os.path.split(os.path.abspath(output_path))
+    temp_output_path = os.path.join(output_dir, f'tmp_{output_filename}')
+    with open_text_file(temp_output_path, 'w') as out_file:
+        if is_json_lines(output_path):
+            compacted_count = write_journal_records(journal_path, out_file, set(), json_lines=True)
+        else:
+            out_file.write('{')
+            compacted_count = write_journal_records(journal_path, out_file, set())
+            out_file.write('}')
+    os.replace(temp_output_path, output_path)
+
+    return compacted_count
+
+
+def read_stored_scenario_ids(output_path):
+    """"""
+    return {scenario_id for scenario_id, _ in iter_json_records(output_path)}
+
+
+def merge_journal(journal_path, output_path, stored_scenario_ids):
+    """"""
+    # JSON lines are merged by appending the journaled records, a compressed output gets another gzip member or
+    # zstandard frame. The size of the output is recorded beforehand to be able to roll back a merge that got interrupted
+    if is_json_lines(output_path):
+        with open(MERGE_MARKER_FILE, 'w') as marker_file:
+            marker_file.write(str(os.path.getsize(output_path)))
+        with open_text_file(output_path, 'a') as out_file:
+            merged_count = write_journal_records(journal_path, out_file, stored_scenario_ids, json_lines=True)
+        os.remove(MERGE_MARKER_FILE)
+        return merged_count
+
+    # Append the journaled records to the existing statistics in place by replacing its closing brace, so that the
+    # unchanged records are neither parsed nor rewritten. The offset of the closing brace is recorded beforehand to be
+    # able to roll back a merge that got interrupted
+    with open(output_path, 'rb') as out_file:
+        tail_offset = max(0, out_file.seek(0, os.SEEK_END) - 16)
+        out_file.seek(tail_offset)
+        closing_brace_offset = tail_offset + out_file.read().rindex(b'}')
+
+    with open(MERGE_MARKER_FILE, 'w') as marker_file:
+        marker_file.write(str(closing_brace_offset))
+
+    with open(output_path, 'r+') as out_file:
+        out_file.seek(closing_brace_offset)
+        out_file.truncate()
+        merged_count = write_journal_records(journal_path, out_file, stored_scenario_ids)
+        out_file.write('}')
+    os.remove(MERGE_MARKER_FILE)
+
+    return merged_count
+
+
+def rollback_interrupted_merge(output_path):
+    """"""
+    if not os.path.exists(MERGE_MARKER_FILE):
+        return
+    with open(MERGE_MARKER_FILE, 'r') as marker_file:
+        merge_offset = int(marker_file.read())
+    with open(output_path, 'rb+') as out_file:
+        out_file.seek(merge_offset)
+        out_file.truncate()
+        if not is_json_lines(output_path):
+            out_file.write(b'}')
+    os.remove(MERGE_MARKER_FILE)
+    print('Rolled back interrupted merge of the journal into the scenario statistics')
+
+
+def download_scenario_statistics_serial(scenario_ids, api_url=API_URL):
+    """"""
+    scenario_statistics = dict()
+
+    for scenario_id in tqdm(scenario_ids):
         try:
-            response = requests.post(API_URL, json=json_request, headers=json_headers)
-            response_json = response.json()
+            response = requests.post(api_url, json=create_scenario_info_request(scenario_id), headers=JSON_HEADERS)
+            response_json = loads(response.content)
         except Exception as e:
             print(f"Error occured with scenario id {scenario_id}: {e}.")
             continue
 
         scenario_statistics[scenario_id] = response_json['data']['scenario']
 
-    with open(JSON_OUTPUT_FILE, 'w') as out_file:
-        json.dump(scenario_statistics, out_file)
+    return scenario_statistics
+
+
+def main():
+    """"""
+    # Listings and existing statistics are read in whichever format they were stored in, e.g. the shipped '.json'
+    # listings, and existing statistics are merged into in their own format
+    if STORE_IN_SQLITE:
+        scenario_ids = list(load_stored_scenario_listings(SQLITE_STORE_FILE))
+    else:
+        listings_path = require_json_records_path(SCENARIO_LISTINGS_JSON_FILE)
+        output_path = resolve_json_records_path(JSON_OUTPUT_FILE)
+        scenario_ids = [scenario_id for scenario_id, _ in iter_json_records(listings_path)]
+        rollback_interrupted_merge(output_path)
+
+    # Scoreboards can't change anymore once a scenario ended, therefore only scenarios missing from the existing
+    # statistics have to be fetched
+    delta_fetch = DELTA_FETCH and (STORE_IN_SQLITE or os.path.exists(output_path))
+    if delta_fetch:
+        stored_scenario_ids = (read_stored_scoreboard_ids(SQLITE_STORE_FILE) if STORE_IN_SQLITE
+                               else read_stored_scenario_ids(output_path))
+        scenario_ids = [scenario_id for scenario_id in scenario_ids if scenario_id not in stored_scenario_ids]
+        print(f'Scenario statistics already stored: {len(stored_scenario_ids)}')
+
+    if os.path.exists(JOURNAL_FILE) and RESUME_FROM_JOURNAL:
+        repair_journal(JOURNAL_FILE)
+        journaled_scenario_ids = read_journaled_scenario_ids(JOURNAL_FILE)
+        scenario_ids = [scenario_id for scenario_id in scenario_ids if scenario_id not in journaled_scenario_ids]
+        print(f'Resuming from journal, scenarios already scraped: {len(journaled_scenario_ids)}')
+    elif os.path.exists(JOURNAL_FILE):
+        os.remove(JOURNAL_FILE)
+
+    journaled_count = run_until_complete(journal_scenario_statistics(scenario_ids, JOURNAL_FILE))
+    print(f'Scenario statistics scraped: {journaled_count}')
 
-    print(f'Scenario statistics scraped: {len(scenario_statistics)}')
+    # The journal is only removed once it was stored, merged or compacted, so that an interrupted run does so once
+    # resumed
+    if STORE_IN_SQLITE:
+        stored_count = store_scenario_statistics(iter_jsonl_items(JOURNAL_FILE), SQLITE_STORE_FILE)
+        print(f'Scenario statistics stored: {stored_count}')
+    elif delta_fetch:
+        merged_count = merge_journal(JOURNAL_FILE, output_path, stored_scenario_ids)
+        print(f'Scenario statistics merged: {merged_count}')
+    else:
+        compacted_count = compact_journal(JOURNAL_FILE, output_path)
+        print(f'Scenario statistics compacted: {compacted_count}')
+    os.remove(JOURNAL_FILE)
     print('fin')
 
 
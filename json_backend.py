@@ -0,0 +1,111 @@
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Backends in the order of preference, the first installed one is used unless JSON_BACKEND names another. The standard
+# library is always available
+JSON_BACKEND = None
+JSON_BACKEND_PREFERENCE = ['orjson', 'ujson', 'json']
+
+
+class JsonBackend:
+    """"""
+
+    def __init__(self, name, loads, dumps, decode_error, item_separator, key_separator):
+        """"""
+        # Item and key separators are the ones dumps uses, so that a document written item by item is identical to the
+        # same document dumped at once
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.decode_error = decode_error
+        self.item_separator = item_separator
+        self.key_separator = key_separator
+
+
+def numpy_default(value):
+    """"""
+    # Numpy values that are not natively serialized by a backend, e.g. np.float64 by the standard library
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+def create_json_backends():
+    """"""
+    # All backends read str as well as bytes and dump to str. Non-ASCII characters are written as they are by orjson,
+    # which always writes UTF-8, and escaped by the others. Numpy scalars and arrays are dumped as the numbers and lists
+    # they hold by all of them, so that the backends are interchangeable
+    json_backends = {'json': JsonBackend('json', json.loads, lambda value: json.dumps(value, default=numpy_default),
+                                         json.JSONDecodeError, ', ', ': ')}
+    if orjson is not None:
+        orjson_options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        json_backends['orjson'] = JsonBackend(
+            'orjson', orjson.loads,
+            lambda value: orjson.dumps(value, default=numpy_default, option=orjson_options).decode('utf-8'),
+            orjson.JSONDecodeError, ',', ':')
+    if ujson is not None:
+        json_backends['ujson'] = JsonBackend(
+            'ujson', ujson.loads,
+            lambda value: ujson.dumps(value, escape_forward_slashes=False, default=numpy_default), ValueError, ',', ':')
+    return json_backends
+
+
+JSON_BACKENDS = create_json_backends()
+
+
+def select_json_backend(backend_name=JSON_BACKEND):
+    """"""
+    if backend_name is not None:
+        if backend_name not in JSON_BACKENDS:
+            raise ImportError(f'The {backend_name} package is required for the {backend_name} JSON backend')
+        return JSON_BACKENDS[backend_name]
+    return next(JSON_BACKENDS[backend_name] for backend_name in JSON_BACKEND_PREFERENCE
+                if backend_name in JSON_BACKENDS)
+
+
+json_backend = select_json_backend()
+JSONDecodeError = json_backend.decode_error
+
+
+def loads(json_text):
+    """"""
+    return json_backend.loads(json_text)
+
+
+def dumps(value):
+    """"""
+    return json_backend.dumps(value)
+
+
+def load(json_file):
+    """"""
+    return json_backend.loads(json_file.read())
+
+
+def dump(value, json_file):
+    """"""
+    # Objects and arrays are written one item at a time, so that a large output is never held in memory as a whole
+    if isinstance(value, dict):
+        json_file.write('{')
+        for item_index, (key, item) in enumerate(value.items()):
+            separator = json_backend.item_separator if item_index else ''
+            json_file.write(f'{separator}{json_backend.dumps(str(key))}{json_backend.key_separator}')
+            json_file.write(json_backend.dumps(item))
+        json_file.write('}')
+    elif isinstance(value, list):
+        json_file.write('[')
+        for item_index, item in enumerate(value):
+            json_file.write(f'{json_backend.item_separator if item_index else ""}{json_backend.dumps(item)}')
+        json_file.write(']')
+    else:
+        json_file.write(json_backend.dumps(value))
@@ -0,0 +1,272 @@
+import time
+import random
+import asyncio
+import statistics
+import aiohttp
+from collections import deque
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from json_backend import loads, dumps
+
+API_URL = 'https://production-api.waremu.com/graphql'
+CONCURRENCY_LIMIT = 16
+REQUESTS_PER_SECOND = 20
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30
+LATENCY_TOLERANCE = 2.0
+# The latency baseline is the median of the last LATENCY_BASELINE_WINDOW successful requests, which is only compared
+# against once at least LATENCY_BASELINE_MIN_SAMPLES latencies were seen
+LATENCY_BASELINE_WINDOW = 256
+LATENCY_BASELINE_MIN_SAMPLES = 16
+DECREASE_COOLDOWN = 1.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Content-Length is deliberately not part of the headers as the HTTP client sets it for each request body
+JSON_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:99.0) Gecko/20100101 Firefox/99.0',
+    'Accept': '*/*',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip',
+    'Referer': 'https://killboard.returnofreckoning.com/',
+    'Content-Type': 'application/json',
+    'Origin': 'https://killboard.returnofreckoning.com',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'cross-site',
+    'TE': 'trailers'
+}
+
+
+class GraphQLRequestError(Exception):
+    """"""
+    pass
+
+
+class GraphQLRetriesExhaustedError(GraphQLRequestError):
+    """"""
+    pass
+
+
+class HostRateLimiter:
+    """"""
+
+    def __init__(self, requests_per_second):
+        """"""
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_slot = dict()
+
+    async def acquire(self, url):
+        """"""
+        # Every request reserves the next free time slot of its host. As the event loop is single-threaded and there
+        # is no await between reading and updating the slot, no lock is required
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, url, seconds):
+        """"""
+        # Push back the next free slot of the host, e.g. as requested by a Retry-After header
+        host = urlparse(url).netloc
+        self.next_slot[host] = max(self.next_slot.get(host, 0), time.monotonic() + seconds)
+
+
+class AdaptiveConcurrencyController:
+    """"""
+
+    def __init__(self, max_limit, min_limit=1, latency_tolerance=LATENCY_TOLERANCE,
+                 latency_baseline_window=LATENCY_BASELINE_WINDOW):
+        """"""
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_tolerance = latency_tolerance
+        self.limit = max_limit
+        self.in_flight = 0
+        self.waiters = list()
+        self.increase_credit = 0
+        self.last_decrease_time = 0
+        self.latency_ewma = None
+        self.recent_latencies = deque(maxlen=latency_baseline_window)
+
+    async def acquire(self):
+        """"""
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_event_loop().create_future()
+            self.waiters.append(waiter)
+            await waiter
+        self.in_flight += 1
+
+    def release(self, latency, success):
+        """"""
+        self.in_flight -= 1
+
+        # Additive increase, multiplicative decrease. The limit is halved when a request fails or when the recent
+        # latency rises well above the median latency of the last requests, which indicates that requests queue up at
+        # the server. A median of a moving window rather than the lowest latency ever seen, which only ever goes down
+        # with jittery latencies, so that the ordinary spread of latencies is not mistaken for congestion. The limit
+        # grows by one again after every full window of successful requests
+        congested = False
+        if success:
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            self.recent_latencies.append(latency)
+            congested = len(self.recent_latencies) >= LATENCY_BASELINE_MIN_SAMPLES and \
+                self.latency_ewma > statistics.median(self.recent_latencies) * self.latency_tolerance
+        if not success or congested:
+            self.decrease()
+        elif self.limit < self.max_limit:
+            self.increase_credit += 1 / self.limit
+            if self.increase_credit >= 1:
+                self.increase_credit = 0
+                self.limit += 1
+
+        # Wake all waiters, they check the current limit themselves
+        waiters, self.waiters = self.waiters, list()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def decrease(self):
+        """"""
+        # Requests that were already in flight report the same congestion, so only decrease once per cooldown
+        now = time.monotonic()
+        if now - self.last_decrease_time < DECREASE_COOLDOWN:
+            return
+        self.last_decrease_time = now
+        self.limit = max(self.min_limit, self.limit // 2)
+        self.increase_credit = 0
+
+
+class AsyncGraphQLClient:
+    """"""
+
+    def __init__(self, api_url=API_URL, concurrency_limit=CONCURRENCY_LIMIT, requests_per_second=REQUESTS_PER_SECOND,
+                 max_retries=MAX_RETRIES, request_timeout=REQUEST_TIMEOUT):
+        """"""
+        self.api_url = api_url
+        self.concurrency_limit = concurrency_limit
+        self.max_retries = max_retries
+        self.request_timeout = request_timeout
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.concurrency_controller = AdaptiveConcurrencyController(concurrency_limit)
+        self.session = None
+
+    async def __aenter__(self):
+        """"""
+        # The pooled session is created here so that it is bound to the running event loop
+        connector = aiohttp.TCPConnector(limit=self.concurrency_limit, limit_per_host=self.concurrency_limit)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        self.session = aiohttp.ClientSession(connector=connector, headers=JSON_HEADERS, timeout=timeout,
+                                             json_serialize=dumps)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """"""
+        await self.session.close()
+
+    async def post(self, json_request):
+        """"""
+        for attempt in range(self.max_retries + 1):
+            request_error = None
+            retry_after = None
+            await self.concurrency_controller.acquire()
+            request_start_time = time.monotonic()
+            try:
+                await self.rate_limiter.acquire(self.api_url)
+                request_start_time = time.monotonic()
+                async with self.session.post(self.api_url, json=json_request) as response:
+                    if response.status in RETRYABLE_STATUS_CODES:
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        request_error = GraphQLRequestError(f'HTTP status {response.status}')
+                    elif response.status >= 400:
+                        # Other client errors won't go away by repeating the request. The error is set before raising
+                        # it, so that the request is released as failed
+                        request_error = GraphQLRequestError(f'HTTP status {response.status}')
+                        raise request_error
+                    else:
+                        response_json = await response.json(loads=loads, content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                request_error = e
+            finally:
+                request_latency = time.monotonic() - request_start_time
+                self.concurrency_controller.release(request_latency, success=request_error is None)
+
+            if request_error is None:
+                return response_json
+            if attempt == self.max_retries:
+                break
+            if retry_after is not None:
+                self.rate_limiter.pause(self.api_url, retry_after)
+            await asyncio.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+
+        raise GraphQLRetriesExhaustedError(f'Request failed after {self.max_retries + 1} attempts: {request_error}')
+
+
+def backoff_delay(attempt):
+    """"""
+    # Exponential backoff with full jitter, so that failed requests of concurrent workers don't retry in lockstep
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def parse_retry_after(retry_after):
+    """"""
+    # Retry-After is either given in seconds or as HTTP date
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+async def iter_unordered(fetch, items, worker_count=CONCURRENCY_LIMIT):
+    """"""
+    # A fixed pool of workers pulls items from a shared iterator and hands results over a bounded queue, so that
+    # neither pending futures nor unconsumed results accumulate in memory for large item counts
+    items_iter = iter(items)
+    result_queue = asyncio.Queue(maxsize=worker_count)
+    worker_done = object()
+
+    async def worker():
+        try:
+            for item in items_iter:
+                await result_queue.put(await fetch(item))
+        except Exception as e:
+            # Hand the exception to the consumer instead of silently losing the worker
+            await result_queue.put(e)
+        await result_queue.put(worker_done)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(worker_count)]
+    try:
+        running_workers = len(workers)
+        while running_workers:
+            result = await result_queue.get()
+            if result is worker_done:
+                running_workers -= 1
+                continue
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        for worker_task in workers:
+            worker_task.cancel()
+
+
+def run_until_complete(coroutine):
+    """"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
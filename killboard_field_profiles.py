@@ -0,0 +1,117 @@
+FULL_SCENARIO_INFO_FIELDS = [
+    'instanceId',
+    'scenarioId',
+    'startTime',
+    'endTime',
+    'winner',
+    'points',
+    'queueType',
+    ('scoreboardEntries', [
+        ('character', ['id', 'name', 'career', '__typename']),
+        ('guild', ['id', 'name', ('heraldry', ['emblem', 'pattern', 'color1', 'color2', 'shape', '__typename']),
+                   '__typename']),
+        'team',
+        'level',
+        'renownRank',
+        'quitter',
+        'protection',
+        'kills',
+        'deathBlows',
+        'deaths',
+        'damage',
+        'healing',
+        'objectiveScore',
+        'killsSolo',
+        'killDamage',
+        'healingSelf',
+        'healingOthers',
+        'protectionSelf',
+        'protectionOthers',
+        'damageReceived',
+        'resurrectionsDone',
+        'healingReceived',
+        'protectionReceived',
+        '__typename'
+    ]),
+    '__typename'
+]
+
+# Only the fields read by the subdivision and the data analysis scripts. The instanceId is required to journal the
+# scenarios, the start and end times to tell the scenarios apart chronologically
+ANALYSIS_MINIMAL_SCENARIO_INFO_FIELDS = [
+    'instanceId',
+    'startTime',
+    'endTime',
+    'points',
+    'queueType',
+    ('scoreboardEntries', [
+        ('character', ['career']),
+        'team',
+        'level',
+        'renownRank',
+        'protection',
+        'deathBlows',
+        'damage',
+        'healing',
+        'killDamage'
+    ])
+]
+
+CUSTOM_SCENARIO_INFO_FIELDS = [
+    'instanceId',
+    'scenarioId',
+    'startTime',
+    'endTime',
+    'points',
+    'queueType',
+    ('scoreboardEntries', [
+        ('character', ['id', 'name', 'career']),
+        ('guild', ['id', 'name']),
+        'team',
+        'level',
+        'renownRank',
+        'protection',
+        'deathBlows',
+        'damage',
+        'healing',
+        'killDamage'
+    ])
+]
+
+FIELD_PROFILES = {
+    'full': FULL_SCENARIO_INFO_FIELDS,
+    'analysis-minimal': ANALYSIS_MINIMAL_SCENARIO_INFO_FIELDS,
+    'custom': CUSTOM_SCENARIO_INFO_FIELDS
+}
+
+
+def build_selection(fields, indent=2):
+    """"""
+    # Fields are either plain field names or (field name, subfields) tuples for object fields
+    selection_lines = ['{']
+    for field in fields:
+        if isinstance(field, str):
+            selection_lines.append(' ' * (indent + 2) + field)
+        else:
+            field_name, subfields = field
+            selection_lines.append(' ' * (indent + 2) + field_name + ' ' + build_selection(subfields, indent + 2))
+    selection_lines.append(' ' * indent + '}')
+    return '\n'.join(selection_lines)
+
+
+def project_fields(value, fields):
+    """"""
+    # Reduce a response value to the given fields, the same way the API resolves a selection set
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [project_fields(item, fields) for item in value]
+
+    projected_value = dict()
+    for field in fields:
+        if isinstance(field, str):
+            projected_value[field] = value[field]
+        else:
+            field_name, subfields = field
+            projected_value[field_name] = project_fields(value[field_name], subfields)
+    return projected_value
@@ -0,0 +1,188 @@
+import re
+import time
+import random
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from json_backend import loads, dumps
+from killboard_field_profiles import project_fields
+from scenario_statistics_stream import load_json_records, require_json_records_path
+from subdivide_scenario_statistics import require_partition_path
+
+STUB_SCENARIO_LISTINGS_JSON = './ror-killboard_scenario_listings.jsonl.gz'
+STUB_SCENARIO_PARTITION = 't1_pug'
+STUB_HOST = '127.0.0.1'
+STUB_PORT = 8765
+STUB_LATENCY = 0.05
+# Sigma of the lognormal factor the latency of each request is multiplied with, 0 for a fixed latency
+STUB_LATENCY_JITTER = 0.0
+STUB_ERROR_RATE = 0.0
+STUB_RETRY_AFTER = 1
+STUB_MAX_BATCH_SIZE = 50
+SCENARIO_FIELD_PATTERN = re.compile(r'(\w+)\s*:\s*scenario\(\s*id:\s*\$(\w+)\s*\)')
+SELECTION_TOKEN_PATTERN = re.compile(r'\w+|[{}]')
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """"""
+    daemon_threads = True
+    # The default listen backlog of 5 drops the connection attempts of highly concurrent clients
+    request_queue_size = 128
+
+
+class StubGraphQLRequestHandler(BaseHTTPRequestHandler):
+    """"""
+    # HTTP/1.1 keeps the connections alive so that connection pooling of the clients is exercised as well. Headers and
+    # body are written separately, which would stall kept alive connections on delayed ACKs with Nagle enabled
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """"""
+        request_body = self.rfile.read(int(self.headers['Content-Length']))
+        json_request = loads(request_body)
+        with self.server.request_count_lock:
+            self.server.request_count += 1
+
+        # Simulate the round-trip latency of the production API, which is jittery rather than fixed
+        latency_factor = random.lognormvariate(0, self.server.latency_jitter) if self.server.latency_jitter else 1
+        time.sleep(self.server.latency * latency_factor)
+
+        # Simulate an overloaded API that throttles part of the requests
+        if random.random() < self.server.error_rate:
+            self.send_response(429)
+            self.send_header('Retry-After', str(self.server.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if json_request.get('operationName') == 'GetScenarioInfo':
+            scenario_id = json_request['variables']['id']
+            scenario_fields = parse_scenario_selection(json_request['query'])
+            response_json = {'data': {'scenario': project_fields(self.server.scenario_statistics.get(scenario_id),
+                                                                 scenario_fields)}}
+        elif json_request.get('operationName') == 'GetScenarioInfoBatch':
+            response_json = self.get_scenario_info_batch(json_request['query'], json_request['variables'])
+        elif json_request.get('operationName') == 'GetScenarioList':
+            response_json = {'data': {'scenarios': self.get_scenario_list(**json_request['variables'])}}
+        else:
+            response_json = {'errors': [{'message': f"Unknown operation {json_request.get('operationName')}"}]}
+
+        response_body = dumps(response_json).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def get_scenario_info_batch(self, query, variables):
+        """"""
+        # Batched queries alias one scenario field per instanceId, e.g. 's0: scenario(id: $id0)'
+        scenario_fields = SCENARIO_FIELD_PATTERN.findall(query)
+        if len(scenario_fields) > self.server.max_batch_size:
+            return {'errors': [{'message': f'Query exceeds {self.server.max_batch_size} scenario fields'}],
+                    'data': None}
+        selection_fields = parse_scenario_selection(query)
+        return {'data': {alias: project_fields(self.server.scenario_statistics.get(variables[variable_name]),
+                                               selection_fields)
+                         for alias, variable_name in scenario_fields}}
+
+    def get_scenario_list(self, first=50, after=None, **kwargs):
+        """"""
+        # The listings are ordered from newest to oldest. The cursors count the position of a scenario from the oldest
+        # one, so that 'after' returns the scenarios that are older than the cursor
+        scenario_listings = self.server.scenario_listings
+        total_count = len(scenario_listings)
+        start_idx = 0 if after is None else max(0, total_count - int(after))
+        end_idx = min(total_count, start_idx + first)
+        return {
+            'totalCount': total_count,
+            'nodes': scenario_listings[start_idx:end_idx],
+            'pageInfo': {
+                'hasNextPage': end_idx < total_count,
+                'endCursor': str(total_count - end_idx),
+                'hasPreviousPage': start_idx > 0,
+                'startCursor': str(total_count - start_idx),
+                '__typename': 'PageInfo'
+            },
+            '__typename': 'ScenarioConnection'
+        }
+
+    def log_message(self, format, *args):
+        """"""
+        pass
+
+
+def parse_selection(tokens, idx):
+    """"""
+    # Parse the selection set starting at the opening brace tokens[idx] into the field format of the field profiles
+    fields = list()
+    idx += 1
+    while tokens[idx] != '}':
+        if tokens[idx + 1] == '{':
+            subfields, next_idx = parse_selection(tokens, idx + 1)
+            fields.append((tokens[idx], subfields))
+            idx = next_idx
+        else:
+            fields.append(tokens[idx])
+            idx += 1
+    return fields, idx + 1
+
+
+def parse_scenario_selection(query):
+    """"""
+    # The selection set of a scenario is either given inline or through the fragment of a batched query. Arguments
+    # are dropped as the scenario fields don't take any
+    if 'fragment' in query:
+        query = query[query.index('fragment'):]
+        selection_text = query[query.index('{'):]
+    else:
+        query = re.sub(r'\([^)]*\)', '', query)
+        selection_text = query[query.index('{', query.index('scenario')):]
+    fields, _ = parse_selection(SELECTION_TOKEN_PATTERN.findall(selection_text), 0)
+    return fields
+
+
+def start_stub_server(scenario_statistics, scenario_listings=None, latency=STUB_LATENCY, error_rate=STUB_ERROR_RATE,
+                      retry_after=STUB_RETRY_AFTER, max_batch_size=STUB_MAX_BATCH_SIZE, host=STUB_HOST, port=0,
+                      latency_jitter=STUB_LATENCY_JITTER):
+    """"""
+    server = ThreadingHTTPServer((host, port), StubGraphQLRequestHandler)
+    server.scenario_statistics = scenario_statistics
+    server.scenario_listings = list(scenario_listings.values()) if scenario_listings else list()
+    server.latency = latency
+    server.latency_jitter = latency_jitter
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.max_batch_size = max_batch_size
+    server.request_count = 0
+    server.request_count_lock = threading.Lock()
+
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    api_url = f'http://{host}:{server.server_address[1]}/graphql'
+    return server, api_url
+
+
+def main():
+    """"""
+    # The inputs are read in whichever format they were stored in, e.g. the shipped '.json' files
+    scenario_statistics = load_json_records(require_partition_path(STUB_SCENARIO_PARTITION))
+    scenario_listings = load_json_records(require_json_records_path(STUB_SCENARIO_LISTINGS_JSON))
+
+    server, api_url = start_stub_server(scenario_statistics, scenario_listings, port=STUB_PORT)
+    print(f'Stub GraphQL server serving {len(scenario_listings)} scenario listings and {len(scenario_statistics)} '
+          f'scenario statistics at {api_url}')
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import os
+import numpy as np
+from scenario_statistics_stream import json_records_stem
+from columnar_scenario_statistics import CAREER_REALMS, REALMS, career_code
+
+AGGREGATED_COUNTERS = ['damage', 'healing', 'protection', 'deathBlows', 'killDamage']
+# Number of scenarios whose aggregates are held in memory before they are appended to the spool file of a partition
+AGGREGATE_CHUNK_SIZE = 4096
+
+
+def realm_aggregates_path(statistics_path):
+    """"""
+    # The index of a partition is stored next to its statistics file
+    return json_records_stem(os.path.abspath(statistics_path)) + '_realm_aggregates.npz'
+
+
+def realm_aggregates_dtype():
+    """"""
+    # Record of the aggregates of a single scenario, whose fields are the arrays of the index
+    return np.dtype([('scenario_instance_id', 'U36'), ('scenario_realm_entry_count', np.int32, len(REALMS))]
+                    + [(f'scenario_realm_{aggregate}_{counter}', np.int64, len(REALMS))
+                       for counter in AGGREGATED_COUNTERS for aggregate in ['total', 'max']])
+
+
+class ScenarioRealmAggregator:
+    """"""
+
+    def __init__(self, npz_path, chunk_size=AGGREGATE_CHUNK_SIZE):
+        """"""
+        # The aggregates are buffered for chunk_size scenarios at a time and then appended to a spool file next to the
+        # index, so that the memory of the aggregation doesn't grow with the number of scenarios of a partition
+        self.npz_path = npz_path
+        self.spool_path = os.path.splitext(npz_path)[0] + '.spool'
+        os.makedirs(os.path.dirname(npz_path), exist_ok=True)
+        self.spool_file = open(self.spool_path, 'wb')
+        self.chunk = np.zeros(chunk_size, dtype=realm_aggregates_dtype())
+        self.chunk_count = 0
+
+    def __enter__(self):
+        """"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """"""
+        # The index is only saved if all scenarios were aggregated, the spool file is removed either way
+        try:
+            if exc_type is None:
+                self.save()
+        finally:
+            self.spool_file.close()
+            os.remove(self.spool_path)
+
+    def add(self, scenario_id, scenario):
+        """"""
+        # The realm of a scoreboard entry is the realm of its career. The maximum of a realm without entries is 0
+        realm_entries = [list() for _ in REALMS]
+        for entry in scenario.scoreboardEntries:
+            realm_entries[CAREER_REALMS[career_code(entry.character.career)]].append(entry)
+
+        scenario_aggregates = self.chunk[self.chunk_count]
+        scenario_aggregates['scenario_instance_id'] = scenario_id
+        scenario_aggregates['scenario_realm_entry_count'] = [len(entries) for entries in realm_entries]
+        for counter in AGGREGATED_COUNTERS:
+            scenario_aggregates[f'scenario_realm_total_{counter}'] = [sum(getattr(entry, counter) for entry in entries)
+                                                                      for entries in realm_entries]
+            scenario_aggregates[f'scenario_realm_max_{counter}'] = [max([getattr(entry, counter) for entry in entries],
+                                                                        default=0) for entries in realm_entries]
+        self.chunk_count += 1
+        if self.chunk_count == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        """"""
+        self.spool_file.write(self.chunk[:self.chunk_count].tobytes())
+        self.chunk_count = 0
+
+    def save(self):
+        """"""
+        # The arrays are written from a memory map of the spool file, which the npz is written from chunk by chunk
+        self.flush()
+        self.spool_file.close()
+        aggregates_dtype = realm_aggregates_dtype()
+        if os.path.getsize(self.spool_path):
+            spooled_aggregates = np.memmap(self.spool_path, dtype=aggregates_dtype, mode='r')
+        else:
+            spooled_aggregates = np.zeros(0, dtype=aggregates_dtype)
+        save_scenario_realm_aggregates({array_name: spooled_aggregates[array_name]
+                                        for array_name in aggregates_dtype.names}, self.npz_path)
+        del spooled_aggregates
+
+
+def build_scenario_realm_aggregates(columnar_statistics):
+    """"""
+    # Same index as the ScenarioRealmAggregator builds, but from the columnar statistics of a partition that was
+    # subdivided without it
+    scenario_count = len(columnar_statistics['scenario_instance_id'])
+    entry_scenario_realm = (columnar_statistics['scenario_index'].astype(np.int64) * len(REALMS)
+                            + CAREER_REALMS[columnar_statistics['career']])
+    realm_aggregates = {
+        'scenario_instance_id': columnar_statistics['scenario_instance_id'],
+        'scenario_realm_entry_count': np.bincount(entry_scenario_realm, minlength=scenario_count * len(REALMS)
+                                                  ).astype(np.int32).reshape(-1, 2)
+    }
+    for counter in AGGREGATED_COUNTERS:
+        counter_values = columnar_statistics[counter].astype(np.int64)
+        realm_totals = np.zeros(scenario_count * len(REALMS), dtype=np.int64)
+        np.add.at(realm_totals, entry_scenario_realm, counter_values)
+        realm_maxima = np.zeros(scenario_count * len(REALMS), dtype=np.int64)
+        np.maximum.at(realm_maxima, entry_scenario_realm, counter_values)
+        realm_aggregates[f'scenario_realm_total_{counter}'] = realm_totals.reshape(-1, 2)
+        realm_aggregates[f'scenario_realm_max_{counter}'] = realm_maxima.reshape(-1, 2)
+    return realm_aggregates
+
+
+def save_scenario_realm_aggregates(realm_aggregates, npz_path):
+    """"""
+    os.makedirs(os.path.dirname(npz_path), exist_ok=True)
+    np.savez(npz_path, **realm_aggregates)
+
+
+def load_scenario_realm_aggregates(statistics_path, columnar_statistics):
+    """"""
+    # The index is (re)built from the columnar statistics whenever it is missing, older than the statistics file or not
+    # of the same scenarios in the same order
+    npz_path = realm_aggregates_path(statistics_path)
+    realm_aggregates = None
+    if os.path.exists(npz_path) and os.path.getmtime(npz_path) >= os.path.getmtime(statistics_path):
+        with np.load(npz_path) as npz_file:
+            realm_aggregates = {array_name: npz_file[array_name] for array_name in npz_file.files}
+    if realm_aggregates is None or not np.array_equal(realm_aggregates['scenario_instance_id'],
+                                                      columnar_statistics['scenario_instance_id']):
+        realm_aggregates = build_scenario_realm_aggregates(columnar_statistics)
+        save_scenario_realm_aggregates(realm_aggregates, npz_path)
+
+    return {array_name: array for array_name, array in realm_aggregates.items()
+            if array_name.startswith('scenario_realm_')}
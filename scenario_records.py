@@ -0,0 +1,133 @@
+import sys
+from collections import OrderedDict
+from scenario_statistics_stream import iter_scenario_statistics
+
+# Records keep the fields of the killboard API under their API names, the same as the columnar statistics and the
+# scenario statistics store. Fields missing from the scraped field profile are None, '__typename' fields and guild
+# heraldries are dropped
+SCENARIO_FIELDS = ['instanceId', 'scenarioId', 'startTime', 'endTime', 'winner', 'points', 'queueType']
+SCOREBOARD_ENTRY_COUNTERS = ['team', 'level', 'renownRank', 'quitter', 'protection', 'kills', 'deathBlows', 'deaths',
+                             'damage', 'healing', 'objectiveScore', 'killsSolo', 'killDamage', 'healingSelf',
+                             'healingOthers', 'protectionSelf', 'protectionOthers', 'damageReceived',
+                             'resurrectionsDone', 'healingReceived', 'protectionReceived']
+# Number of characters and of guilds a parser shares between the entries it parses. Beyond that the least recently seen
+# ones are dropped, so that the memory of a parser is bounded however many scenarios it parses
+RECORD_CACHE_SIZE = 1 << 16
+
+
+class Character:
+    """"""
+    __slots__ = ('id', 'name', 'career')
+
+    def __init__(self, character_id, name, career):
+        """"""
+        self.id = character_id
+        self.name = name
+        self.career = career
+
+
+class Guild:
+    """"""
+    __slots__ = ('id', 'name')
+
+    def __init__(self, guild_id, name):
+        """"""
+        self.id = guild_id
+        self.name = name
+
+
+class ScoreboardEntry:
+    """"""
+    __slots__ = ('character', 'guild') + tuple(SCOREBOARD_ENTRY_COUNTERS)
+
+    def __init__(self, character, guild, counter_values):
+        """"""
+        self.character = character
+        self.guild = guild
+        for counter, counter_value in zip(SCOREBOARD_ENTRY_COUNTERS, counter_values):
+            setattr(self, counter, counter_value)
+
+
+class Scenario:
+    """"""
+    __slots__ = tuple(SCENARIO_FIELDS) + ('scoreboardEntries',)
+
+    def __init__(self, field_values, scoreboard_entries):
+        """"""
+        for field, field_value in zip(SCENARIO_FIELDS, field_values):
+            setattr(self, field, field_value)
+        self.scoreboardEntries = scoreboard_entries
+
+
+class ScenarioRecordParser:
+    """"""
+
+    def __init__(self, cache_size=RECORD_CACHE_SIZE):
+        """"""
+        # Characters and guilds are shared by all entries of the same character or guild with the same name, so that a
+        # character playing many scenarios is held in memory once. Careers and queue types are interned strings
+        self.cache_size = cache_size
+        self.characters = OrderedDict()
+        self.guilds = OrderedDict()
+
+    def parse_character(self, character_info):
+        """"""
+        character_key = (character_info.get('id'), character_info.get('name'), character_info['career'])
+        character = self.characters.get(character_key)
+        if character is None:
+            character = self.characters[character_key] = Character(character_key[0], character_key[1],
+                                                                    sys.intern(character_key[2]))
+            if len(self.characters) > self.cache_size:
+                self.characters.popitem(last=False)
+        else:
+            self.characters.move_to_end(character_key)
+        return character
+
+    def parse_guild(self, guild_info):
+        """"""
+        if guild_info is None:
+            return None
+        guild_key = (guild_info.get('id'), guild_info.get('name'))
+        guild = self.guilds.get(guild_key)
+        if guild is None:
+            guild = self.guilds[guild_key] = Guild(*guild_key)
+            if len(self.guilds) > self.cache_size:
+                self.guilds.popitem(last=False)
+        else:
+            self.guilds.move_to_end(guild_key)
+        return guild
+
+    def parse_entry(self, entry_info):
+        """"""
+        return ScoreboardEntry(self.parse_character(entry_info['character']),
+                               self.parse_guild(entry_info.get('guild')),
+                               [entry_info.get(counter) for counter in SCOREBOARD_ENTRY_COUNTERS])
+
+    def parse(self, scenario_info):
+        """"""
+        # Accepts a scenario of the GraphQL response as well as one of the scenario statistics files or store
+        points, queue_type = scenario_info.get('points'), scenario_info.get('queueType')
+        field_values = [scenario_info.get('instanceId'), scenario_info.get('scenarioId'),
+                        scenario_info.get('startTime'), scenario_info.get('endTime'), scenario_info.get('winner'),
+                        None if points is None else tuple(points),
+                        None if queue_type is None else sys.intern(queue_type)]
+        scoreboard_entries = [self.parse_entry(entry_info) for entry_info in scenario_info['scoreboardEntries']]
+        return Scenario(field_values, scoreboard_entries)
+
+
+def parse_scenario(scenario_info):
+    """"""
+    return ScenarioRecordParser().parse(scenario_info)
+
+
+def iter_scenario_records(statistics_path):
+    """"""
+    # Yields the (scenario id, scenario record) items of a statistics file, one scenario at a time
+    scenario_record_parser = ScenarioRecordParser()
+    for scenario_id, scenario_info in iter_scenario_statistics(statistics_path):
+        yield scenario_id, scenario_record_parser.parse(scenario_info)
+
+
+def load_scenario_records(statistics_path):
+    """"""
+    return dict(iter_scenario_records(statistics_path))
@@ -0,0 +1,261 @@
+import os
+import sqlite3
+import itertools
+from tqdm import tqdm
+from json_backend import loads, dumps
+from scenario_statistics_stream import iter_scenario_statistics, load_json_records, find_json_records_path, \
+    require_json_records_path
+from columnar_scenario_statistics import ENTRY_COUNTERS, columnarize_scenario_statistics
+from scenario_records import ScenarioRecordParser, parse_scenario
+from subdivide_scenario_statistics import classify_scenario
+
+SQLITE_STORE_FILE = './ror-killboard.sqlite3'
+SCENARIO_LISTINGS_JSON_FILE = './ror-killboard_scenario_listings.jsonl.gz'
+SCENARIO_STATISTICS_JSON_FILE = './ror-killboard_scenario_statistics.jsonl.gz'
+INSERT_BATCH_SIZE = 500
+
+# Queue types of the scenarios of a partition, the tier of a partition is the part of its name before the underscore
+PARTITION_QUEUE_TYPES = {'standard': ['STANDARD'], 'pug': ['PUG', 'DUO'], 'city': ['CITY'],
+                         'group-ranked': ['GROUP_RANKED']}
+
+# Columns are named after the fields of the killboard API, so that stored scenarios can be returned in the very same
+# shape as they were scraped. Scenarios only known from the listings have no scoreboard yet
+ENTRY_COLUMNS = list(ENTRY_COUNTERS)
+STORE_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS scenarios (instanceId TEXT PRIMARY KEY, scenarioId INTEGER, startTime INTEGER, '
+    'endTime INTEGER, winner INTEGER, points TEXT, queueType TEXT, tier TEXT, hasScoreboard INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE IF NOT EXISTS characters (id TEXT PRIMARY KEY, name TEXT, career TEXT)',
+    'CREATE TABLE IF NOT EXISTS guilds (id TEXT PRIMARY KEY, name TEXT, heraldry TEXT)',
+    'CREATE TABLE IF NOT EXISTS scoreboard_entries (instanceId TEXT NOT NULL, entryIndex INTEGER NOT NULL, '
+    'characterId TEXT, guildId TEXT, career TEXT, ' + ', '.join(f'{column} INTEGER' for column in ENTRY_COLUMNS) + ', '
+    'PRIMARY KEY (instanceId, entryIndex))',
+    'CREATE INDEX IF NOT EXISTS scenarios_queue_type ON scenarios (queueType)',
+    'CREATE INDEX IF NOT EXISTS scenarios_tier_start_time ON scenarios (tier, startTime)',
+    'CREATE INDEX IF NOT EXISTS scenarios_start_time ON scenarios (startTime)',
+    'CREATE INDEX IF NOT EXISTS scoreboard_entries_career ON scoreboard_entries (career)'
+]
+
+# Upserts are written as an INSERT OR IGNORE followed by an UPDATE, as SQLite only supports ON CONFLICT DO UPDATE from
+# version 3.24 on. Scenarios are never replaced, so that they keep the rowid, i.e. the position, they were first stored at
+INSERT_LISTING = ('INSERT OR IGNORE INTO scenarios (instanceId, scenarioId, startTime, endTime, winner, points) '
+                  'VALUES (?, ?, ?, ?, ?, ?)')
+UPDATE_SCENARIO = ('UPDATE scenarios SET scenarioId = ?, startTime = ?, endTime = ?, winner = ?, points = ?, '
+                   'queueType = ?, tier = ?, hasScoreboard = 1 WHERE instanceId = ?')
+INSERT_CHARACTER = 'INSERT OR REPLACE INTO characters (id, name, career) VALUES (?, ?, ?)'
+INSERT_GUILD = 'INSERT OR REPLACE INTO guilds (id, name, heraldry) VALUES (?, ?, ?)'
+INSERT_ENTRY = ('INSERT INTO scoreboard_entries (instanceId, entryIndex, characterId, guildId, career, '
+                + ', '.join(ENTRY_COLUMNS) + ') VALUES (' + ', '.join(['?'] * (5 + len(ENTRY_COLUMNS))) + ')')
+
+
+def connect_store(store_path=SQLITE_STORE_FILE):
+    """"""
+    connection = sqlite3.connect(os.path.abspath(store_path))
+    for statement in STORE_SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+def iter_batches(items, batch_size):
+    """"""
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def scenario_tier(scenario_info):
+    """"""
+    # The tier a scenario is subdivided into, which for city and group ranked scenarios is t4 regardless of the levels
+    if not scenario_info.get('queueType') or not scenario_info.get('scoreboardEntries'):
+        return None
+    return classify_scenario(parse_scenario(scenario_info)).split('_')[0]
+
+
+def store_scenario_listings(scenario_listings, store_path=SQLITE_STORE_FILE, batch_size=INSERT_BATCH_SIZE):
+    """"""
+    # Listings never overwrite a stored scenario, as the listing fields of an ended scenario can't change anymore
+    connection = connect_store(store_path)
+    try:
+        for batch in iter_batches(scenario_listings.items(), batch_size):
+            with connection:
+                connection.executemany(INSERT_LISTING, [
+                    (scenario_id, listing.get('scenarioId'), listing.get('startTime'), listing.get('endTime'),
+                     listing.get('winner'), dumps(listing.get('points'))) for scenario_id, listing in batch])
+    finally:
+        connection.close()
+
+
+def store_scenario_statistics(scenario_statistics, store_path=SQLITE_STORE_FILE, batch_size=INSERT_BATCH_SIZE):
+    """"""
+    # Scenario statistics are (scenario id, scenario info) items. Each batch of scenarios is inserted in a single
+    # transaction. Characters and guilds are stored once and keep the name they had in the last stored scenario
+    stored_count = 0
+    connection = connect_store(store_path)
+    try:
+        for batch in iter_batches(scenario_statistics, batch_size):
+            scenario_rows, character_rows, guild_rows, entry_rows = list(), dict(), dict(), list()
+            for scenario_id, scenario_info in batch:
+                scenario_rows.append((scenario_id, scenario_info.get('scenarioId'), scenario_info.get('startTime'),
+                                      scenario_info.get('endTime'), scenario_info.get('winner'),
+                                      dumps(scenario_info.get('points')), scenario_info.get('queueType'),
+                                      scenario_tier(scenario_info)))
+                for entry_index, entry in enumerate(scenario_info.get('scoreboardEntries') or list()):
+                    # Characters and guilds are only stored if their id was scraped, which depends on the field
+                    # profile, the career of an entry is stored with the entry itself
+                    character, guild = entry.get('character') or dict(), entry.get('guild') or dict()
+                    if character.get('id') is not None:
+                        character_rows[character['id']] = (character['id'], character.get('name'),
+                                                           character.get('career'))
+                    if guild.get('id') is not None:
+                        guild_rows[guild['id']] = (guild['id'], guild.get('name'), dumps(guild.get('heraldry')))
+                    entry_rows.append((scenario_id, entry_index, character.get('id'), guild.get('id'),
+                                       character.get('career')) + tuple(entry.get(column) for column in ENTRY_COLUMNS))
+
+            with connection:
+                connection.executemany(INSERT_LISTING, [scenario_row[:6] for scenario_row in scenario_rows])
+                connection.executemany(UPDATE_SCENARIO, [scenario_row[1:] + scenario_row[:1]
+                                                         for scenario_row in scenario_rows])
+                connection.executemany(INSERT_CHARACTER, character_rows.values())
+                connection.executemany(INSERT_GUILD, guild_rows.values())
+                # A scenario stored again replaces its scoreboard entries
+                connection.executemany('DELETE FROM scoreboard_entries WHERE instanceId = ?',
+                                       [(scenario_row[0],) for scenario_row in scenario_rows])
+                connection.executemany(INSERT_ENTRY, entry_rows)
+            stored_count += len(batch)
+    finally:
+        connection.close()
+
+    return stored_count
+
+
+def partition_filter(partition_name):
+    """"""
+    # Query arguments that select the scenarios of a partition, e.g. partition_filter('t4_standard')
+    tier, scenario_type = partition_name.split('_', 1)
+    return {'tier': tier, 'queue_types': PARTITION_QUEUE_TYPES[scenario_type]}
+
+
+def create_scenario_query(tier=None, queue_types=None, start_time_from=None, start_time_to=None):
+    """"""
+    conditions, parameters = ['scenarios.hasScoreboard = 1'], list()
+    if tier is not None:
+        conditions.append('scenarios.tier = ?')
+        parameters.append(tier)
+    if queue_types is not None:
+        conditions.append('scenarios.queueType IN (' + ', '.join(['?'] * len(queue_types)) + ')')
+        parameters += list(queue_types)
+    if start_time_from is not None:
+        conditions.append('scenarios.startTime >= ?')
+        parameters.append(start_time_from)
+    if start_time_to is not None:
+        conditions.append('scenarios.startTime < ?')
+        parameters.append(start_time_to)
+    return ' AND '.join(conditions), parameters
+
+
+def create_scoreboard_entry(entry_row):
+    """"""
+    character_id, character_name, career, guild_id, guild_name, guild_heraldry = entry_row[:6]
+    entry = {
+        'character': {'id': character_id, 'name': character_name, 'career': career, '__typename': 'Character'},
+        'guild': None if guild_id is None else {'id': guild_id, 'name': guild_name,
+                                                'heraldry': loads(guild_heraldry), '__typename': 'Guild'}
+    }
+    for column, value in zip(ENTRY_COLUMNS, entry_row[6:]):
+        if value is not None:
+            entry[column] = bool(value) if column == 'quitter' else value
+    entry['__typename'] = 'ScenarioScoreboardEntry'
+    return entry
+
+
+def iter_stored_scenario_statistics(store_path=SQLITE_STORE_FILE, tier=None, queue_types=None, start_time_from=None,
+                                    start_time_to=None):
+    """"""
+    # Yields the (scenario id, scenario info) items of the stored scenarios matching the query in the order they were
+    # first stored, shaped like the items of the scenario statistics files. A single indexed query reads the scenarios
+    # together with their scoreboard entries, so that only the matching rows are touched and only a single scenario is
+    # held in memory at any time
+    conditions, parameters = create_scenario_query(tier, queue_types, start_time_from, start_time_to)
+    connection = connect_store(store_path)
+    try:
+        rows = connection.execute(
+            'SELECT scenarios.instanceId, scenarios.scenarioId, scenarios.startTime, scenarios.endTime, '
+            'scenarios.winner, scenarios.points, scenarios.queueType, scoreboard_entries.entryIndex, '
+            'scoreboard_entries.characterId, characters.name, scoreboard_entries.career, scoreboard_entries.guildId, '
+            'guilds.name, guilds.heraldry, ' + ', '.join(f'scoreboard_entries.{column}' for column in ENTRY_COLUMNS) +
+            ' FROM scenarios LEFT JOIN scoreboard_entries ON scoreboard_entries.instanceId = scenarios.instanceId'
+            ' LEFT JOIN characters ON characters.id = scoreboard_entries.characterId'
+            ' LEFT JOIN guilds ON guilds.id = scoreboard_entries.guildId'
+            f' WHERE {conditions} ORDER BY scenarios.rowid, scoreboard_entries.entryIndex', parameters)
+
+        for scenario_id, scenario_rows in itertools.groupby(rows, key=lambda row: row[0]):
+            first_row = next(scenario_rows)
+            scenario_info = {'instanceId': scenario_id, 'scenarioId': first_row[1], 'startTime': first_row[2],
+                             'endTime': first_row[3], 'winner': first_row[4], 'points': loads(first_row[5]),
+                             'queueType': first_row[6], 'scoreboardEntries': list(), '__typename': 'Scenario'}
+            for row in itertools.chain([first_row], scenario_rows):
+                if row[7] is not None:
+                    scenario_info['scoreboardEntries'].append(create_scoreboard_entry(row[8:]))
+            yield scenario_id, scenario_info
+    finally:
+        connection.close()
+
+
+def load_stored_columnar_scenario_statistics(partition_name, store_path=SQLITE_STORE_FILE, start_time_from=None,
+                                             start_time_to=None):
+    """"""
+    # The columnar statistics of the stored scenarios of a partition, optionally of a range of start times, queried
+    # without a partition file having to be subdivided
+    stored_scenario_statistics = iter_stored_scenario_statistics(store_path, start_time_from=start_time_from,
+                                                                 start_time_to=start_time_to,
+                                                                 **partition_filter(partition_name))
+    scenario_record_parser = ScenarioRecordParser()
+    return columnarize_scenario_statistics((scenario_id, scenario_record_parser.parse(scenario_info))
+                                           for scenario_id, scenario_info in stored_scenario_statistics)
+
+
+def load_stored_scenario_listings(store_path=SQLITE_STORE_FILE):
+    """"""
+    # The listings of all stored scenarios ordered from newest to oldest, shaped like the items of the listings files
+    connection = connect_store(store_path)
+    try:
+        rows = connection.execute('SELECT instanceId, scenarioId, startTime, endTime, winner, points FROM scenarios '
+                                  'ORDER BY startTime DESC, rowid')
+        return {scenario_id: {'instanceId': scenario_id, 'scenarioId': scenario_type_id, 'startTime': start_time,
+                              'endTime': end_time, 'winner': winner, 'points': loads(points), '__typename': 'Scenario'}
+                for scenario_id, scenario_type_id, start_time, end_time, winner, points in rows}
+    finally:
+        connection.close()
+
+
+def read_stored_scoreboard_ids(store_path=SQLITE_STORE_FILE):
+    """"""
+    # Ids of the stored scenarios whose scoreboard was stored as well
+    connection = connect_store(store_path)
+    try:
+        return {scenario_id for scenario_id, in connection.execute('SELECT instanceId FROM scenarios '
+                                                                    'WHERE hasScoreboard = 1')}
+    finally:
+        connection.close()
+
+
+def main():
+    """"""
+    # Imports the scraped listings and statistics files into the store, after which the downloaders can be switched to
+    # storing in it instead of the files with STORE_IN_SQLITE. Either file is read in whichever format it was stored in
+    listings_path = find_json_records_path(SCENARIO_LISTINGS_JSON_FILE)
+    if listings_path is not None:
+        store_scenario_listings(load_json_records(listings_path))
+    statistics_path = require_json_records_path(SCENARIO_STATISTICS_JSON_FILE)
+    stored_count = store_scenario_statistics(tqdm(iter_scenario_statistics(statistics_path)))
+
+    print(f'Scenario statistics stored: {stored_count}')
+    print(f'Store written to {os.path.abspath(SQLITE_STORE_FILE)}')
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import os
+import io
+import glob
+import gzip
+import json
+from json_backend import json_backend, loads, dumps
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+READ_CHUNK_SIZE = 1 << 20
+# Uncompressed JSON object files up to this size are decoded at once by the JSON backend instead of incrementally
+WHOLE_FILE_DECODE_LIMIT = 16 << 20
+GZIP_COMPRESS_LEVEL = 6
+ZSTD_COMPRESS_LEVEL = 10
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+CONVERT_JSON_FILES = ['./ror-killboard_scenario_listings.json', './ror-killboard_scenario_statistics.json',
+                      './subdivided_scenario_statistics/scenario_statistics_*.json']
+CONVERTED_FILE_EXTENSION = '.jsonl.gz'
+# Formats the records of a file may be stored in, in the order existing files are looked for
+JSON_RECORDS_EXTENSIONS = ['.jsonl.gz', '.jsonl.zst', '.jsonl', '.json']
+
+
+def file_compression(file_path, mode):
+    """"""
+    # Files are read according to their content, so that a compressed file is read regardless of its name, and written
+    # according to their extension, '.gz' for gzip and '.zst' for zstandard
+    if mode == 'r':
+        with open(file_path, 'rb') as binary_file:
+            magic = binary_file.read(len(ZSTD_MAGIC))
+        if magic.startswith(GZIP_MAGIC):
+            return 'gzip'
+        if magic == ZSTD_MAGIC:
+            return 'zstd'
+        return None
+    if file_path.endswith('.gz'):
+        return 'gzip'
+    if file_path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+def open_text_file(file_path, mode='r'):
+    """"""
+    # Appending to a compressed file adds another gzip member or zstandard frame, which are read as one stream
+    compression = file_compression(file_path, mode)
+    if compression == 'gzip':
+        return gzip.open(file_path, mode + 't', compresslevel=GZIP_COMPRESS_LEVEL, encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError(f'The zstandard package is required to read or write {file_path}')
+        binary_file = open(file_path, mode + 'b')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(binary_file, read_across_frames=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=ZSTD_COMPRESS_LEVEL).stream_writer(binary_file)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(file_path, mode, encoding='utf-8')
+
+
+def is_json_lines(file_path):
+    """"""
+    return '.jsonl' in os.path.basename(file_path)
+
+
+def json_records_stem(file_path):
+    """"""
+    # File path without its record format and compression extensions
+    for extension in ('.gz', '.zst', '.jsonl', '.json'):
+        if file_path.endswith(extension):
+            file_path = file_path[:-len(extension)]
+    return file_path
+
+
+def find_json_records_path(file_path):
+    """"""
+    # The existing file of the records of file_path in whichever format they were stored in, preferring file_path
+    # itself, e.g. the shipped '.json' files for the '.jsonl.gz' defaults. None if there is none
+    if os.path.exists(file_path):
+        return file_path
+    for extension in JSON_RECORDS_EXTENSIONS:
+        if os.path.exists(json_records_stem(file_path) + extension):
+            return json_records_stem(file_path) + extension
+    return None
+
+
+def resolve_json_records_path(file_path):
+    """"""
+    # The existing file of the records of file_path, or file_path itself if they are yet to be written
+    return find_json_records_path(file_path) or file_path
+
+
+def require_json_records_path(file_path):
+    """"""
+    json_records_path = find_json_records_path(file_path)
+    if json_records_path is None:
+        raise FileNotFoundError(f'No records of {file_path} in any of the formats {", ".join(JSON_RECORDS_EXTENSIONS)}')
+    return json_records_path
+
+
+class JsonObjectWriter:
+    """"""
+
+    def __init__(self, json_path):
+        """"""
+        self.json_file = open_text_file(json_path, 'w')
+        self.json_file.write('{')
+        self.item_count = 0
+
+    def write(self, key, value):
+        """"""
+        # Same separators as the JSON backend dumps with, so that the output is identical to dumping the whole dict
+        separator = json_backend.item_separator if self.item_count else ''
+        self.json_file.write(f'{separator}{dumps(key)}{json_backend.key_separator}{dumps(value)}')
+        self.item_count += 1
+
+    def close(self, complete=True):
+        """"""
+        # An incomplete object is left without its closing brace, so that it is read as truncated rather than complete
+        if complete:
+            self.json_file.write('}')
+        self.json_file.close()
+
+    def __enter__(self):
+        """"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """"""
+        self.close(complete=exc_type is None)
+
+
+class JsonLinesWriter:
+    """"""
+
+    def __init__(self, jsonl_path, mode='w'):
+        """"""
+        self.jsonl_file = open_text_file(jsonl_path, mode)
+
+    def write(self, key, value):
+        """"""
+        # One record per line, the key of a record is part of the record itself
+        self.jsonl_file.write(dumps(value) + '\n')
+
+    def close(self):
+        """"""
+        self.jsonl_file.close()
+
+    def __enter__(self):
+        """"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """"""
+        self.close()
+
+
+def open_json_records_writer(file_path):
+    """"""
+    return JsonLinesWriter(file_path) if is_json_lines(file_path) else JsonObjectWriter(file_path)
+
+
+def iter_json_object_items(json_path, chunk_size=READ_CHUNK_SIZE, whole_file_decode_limit=WHOLE_FILE_DECODE_LIMIT):
+    """"""
+    # Small uncompressed files are decoded at once by the JSON backend, which is faster than the incremental decoding
+    # only the standard library offers
+    if file_compression(json_path, 'r') is None and os.path.getsize(json_path) <= whole_file_decode_limit:
+        with open(json_path, 'rb') as json_file:
+            json_object = loads(json_file.read())
+        if not isinstance(json_object, dict):
+            raise ValueError(f'{json_path} does not contain a JSON object')
+        yield from json_object.items()
+        return
+
+    # Incrementally decode the items of a top-level JSON object so that only the current item and one read chunk are
+    # held in memory, regardless of the size of the file
+    decoder = json.JSONDecoder()
+    with open_text_file(json_path, 'r') as json_file:
+        buffer = ''
+        position = 0
+        end_of_file = False
+
+        def skip(characters):
+            nonlocal buffer, position, end_of_file
+            while True:
+                while position < len(buffer) and buffer[position] in characters:
+                    position += 1
+                if position < len(buffer) or end_of_file:
+                    return
+                buffer, position = json_file.read(chunk_size), 0
+                end_of_file = not buffer
+
+        def decode():
+            nonlocal buffer, position, end_of_file
+            while True:
+                try:
+                    value, end_position = decoder.raw_decode(buffer, position)
+                    # A number at the very end of the buffer might continue in the next chunk
+                    if end_position < len(buffer) or end_of_file:
+                        position = end_position
+                        return value
+                except json.JSONDecodeError:
+                    if end_of_file:
+                        raise
+                # Read at least as much as is buffered already, so that items larger than a chunk don't get decoded
+                # over and over again
+                chunk = json_file.read(max(chunk_size, len(buffer) - position))
+                end_of_file = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+
+        skip(' \t\r\n')
+        if buffer[position:position + 1] != '{':
+            raise ValueError(f'{json_path} does not contain a JSON object')
+        position += 1
+
+        while True:
+            skip(' \t\r\n,')
+            # A file that ends before the closing brace was truncated, e.g. by an interrupted write
+            if end_of_file:
+                raise ValueError(f'{json_path} ends before the closing brace of its JSON object')
+            if buffer[position] == '}':
+                return
+            key = decode()
+            skip(' \t\r\n:')
+            yield key, decode()
+
+
+def iter_jsonl_items(jsonl_path, key_field='instanceId'):
+    """"""
+    with open_text_file(jsonl_path, 'r') as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                record = loads(line)
+                yield record[key_field], record
+
+
+def iter_json_records(file_path, key_field='instanceId'):
+    """"""
+    # Records are either stored as one JSON object keyed by key_field or as one record per line, as in the journal of
+    # the statistics downloader, either of them optionally compressed
+    if is_json_lines(file_path):
+        return iter_jsonl_items(file_path, key_field)
+    return iter_json_object_items(file_path)
+
+
+def iter_scenario_statistics(statistics_path):
+    """"""
+    return iter_json_records(statistics_path)
+
+
+def load_json_records(file_path, key_field='instanceId'):
+    """"""
+    return dict(iter_json_records(file_path, key_field))
+
+
+def write_json_records(file_path, records):
+    """"""
+    with open_json_records_writer(file_path) as records_writer:
+        for key, record in records.items():
+            records_writer.write(key, record)
+
+
+def main():
+    """"""
+    # Converts the JSON object files of the listings, statistics and partitions into compressed JSON lines next to them
+    json_paths = [json_path for json_pattern in CONVERT_JSON_FILES for json_path in sorted(glob.glob(json_pattern))]
+    for json_path in json_paths:
+        converted_path = json_records_stem(json_path) + CONVERTED_FILE_EXTENSION
+        with JsonLinesWriter(converted_path) as records_writer:
+            for key, record in iter_json_object_items(json_path):
+                records_writer.write(key, record)
+        print(f'{json_path} ({os.path.getsize(json_path)} bytes) -> {converted_path} '
+              f'({os.path.getsize(converted_path)} bytes)')
+
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
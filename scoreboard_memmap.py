@@ -0,0 +1,160 @@
+import os
+import glob
+import shutil
+import numpy as np
+from tqdm import tqdm
+from string_tables import StringTable
+from columnar_scenario_statistics import SUBDIVIDED_JSON_DIR, CAREER_TABLE, CAREER_CODES, ENTRY_COUNTERS, \
+    INTERNED_ENTITIES, statistics_store_name, load_columnar_scenario_statistics
+
+SCOREBOARD_MEMMAP_DIR = './scoreboard_memmap/'
+# Every array is a plain .npy file, so that opening it only reads its header and maps the rest
+MEMMAP_ARRAYS = ['entries', 'scenarios', 'scenario_entry_offsets', 'sorted_scenario_ids', 'sorted_scenario_indices',
+                 'career_entry_offsets', 'career_entry_indices']
+# String tables of the character and guild codes of the entries, only stored if the statistics have them
+MEMMAP_STRING_TABLES = [f'table_{entity}_{column}' for entity in INTERNED_ENTITIES for column in ['id', 'name']]
+
+
+def scoreboard_memmap_dir(statistics_path, scoreboard_memmap_outdir=SCOREBOARD_MEMMAP_DIR):
+    """"""
+    return os.path.abspath(scoreboard_memmap_outdir) + f'/{statistics_store_name(statistics_path)}'
+
+
+def build_scoreboard_memmap(columnar_statistics):
+    """"""
+    # Scoreboard entries are fixed-width records of their scenario index, career code and scoreboard counters, stored in
+    # scenario order, so that the scoreboard of scenario i is the slice scenario_entry_offsets[i]:[i + 1]. Scenarios are
+    # found by binary search over their sorted instanceIds and the entries of a career through the entry indices grouped
+    # by career, where career c owns career_entry_indices[career_entry_offsets[c]:career_entry_offsets[c + 1]]
+    entry_fields = ['scenario_index', 'career'] + [column for column in INTERNED_ENTITIES + list(ENTRY_COUNTERS)
+                                                   if column in columnar_statistics]
+    entries = np.empty(len(columnar_statistics['career']),
+                       dtype=[(field, columnar_statistics[field].dtype) for field in entry_fields])
+    for field in entry_fields:
+        entries[field] = columnar_statistics[field]
+
+    scenario_ids = columnar_statistics['scenario_instance_id'].astype('S36')
+    scenarios = np.empty(len(scenario_ids), dtype=[('instance_id', 'S36'), ('queue_type', np.int8),
+                                                   ('start_time', np.int64), ('end_time', np.int64),
+                                                   ('points', np.int32, (2,))])
+    scenarios['instance_id'] = scenario_ids
+    scenarios['queue_type'] = columnar_statistics['scenario_queue_type']
+    scenarios['start_time'] = columnar_statistics['scenario_start_time']
+    scenarios['end_time'] = columnar_statistics['scenario_end_time']
+    scenarios['points'] = columnar_statistics['scenario_points']
+
+    sorted_scenario_indices = np.argsort(scenario_ids, kind='stable')
+    career_entry_counts = np.bincount(columnar_statistics['career'], minlength=len(CAREER_TABLE))
+    string_tables = {table_name: columnar_statistics[table_name] for table_name in MEMMAP_STRING_TABLES
+                     if table_name in columnar_statistics}
+    return dict(string_tables, **{
+        'entries': entries,
+        'scenarios': scenarios,
+        'scenario_entry_offsets': columnar_statistics['scenario_entry_offsets'],
+        'sorted_scenario_ids': scenario_ids[sorted_scenario_indices],
+        'sorted_scenario_indices': sorted_scenario_indices,
+        'career_entry_offsets': np.concatenate([[0], np.cumsum(career_entry_counts)]).astype(np.int64),
+        'career_entry_indices': np.argsort(columnar_statistics['career'], kind='stable')
+    })
+
+
+def save_scoreboard_memmap(scoreboard_memmap, memmap_dir):
+    """"""
+    # The arrays are written to a temporary directory that replaces the previous one once complete, so that an
+    # interrupted build never leaves arrays of different statistics behind
+    temp_memmap_dir = memmap_dir + '.tmp'
+    shutil.rmtree(temp_memmap_dir, ignore_errors=True)
+    os.makedirs(temp_memmap_dir)
+    for array_name in MEMMAP_ARRAYS + [table_name for table_name in MEMMAP_STRING_TABLES
+                                       if table_name in scoreboard_memmap]:
+        np.save(os.path.join(temp_memmap_dir, f'{array_name}.npy'), scoreboard_memmap[array_name])
+    shutil.rmtree(memmap_dir, ignore_errors=True)
+    os.rename(temp_memmap_dir, memmap_dir)
+
+
+class ScoreboardMemmap:
+    """"""
+
+    def __init__(self, memmap_dir):
+        """"""
+        for array_name in MEMMAP_ARRAYS:
+            setattr(self, array_name, np.load(os.path.join(memmap_dir, f'{array_name}.npy'), mmap_mode='r'))
+        self.memmap_dir = memmap_dir
+        self.string_tables = dict()
+
+    def __len__(self):
+        """"""
+        return len(self.scenarios)
+
+    def scenario_index(self, scenario_id):
+        """"""
+        encoded_scenario_id = scenario_id.encode('ascii')
+        position = int(np.searchsorted(self.sorted_scenario_ids, encoded_scenario_id))
+        if position == len(self.sorted_scenario_ids) or self.sorted_scenario_ids[position] != encoded_scenario_id:
+            raise KeyError(scenario_id)
+        return int(self.sorted_scenario_indices[position])
+
+    def scoreboard(self, scenario_id):
+        """"""
+        # A view of the memory mapped entries, only the pages of the scoreboard are read once it is accessed
+        scenario_index = self.scenario_index(scenario_id)
+        return self.entries[self.scenario_entry_offsets[scenario_index]:self.scenario_entry_offsets[scenario_index + 1]]
+
+    def career_entry_indices_of(self, career):
+        """"""
+        career_code = CAREER_CODES[career]
+        career_start, career_end = self.career_entry_offsets[career_code], self.career_entry_offsets[career_code + 1]
+        return self.career_entry_indices[career_start:career_end]
+
+    def career_entries(self, career):
+        """"""
+        # The entries of a career are spread over all scenarios, so they are gathered into a copy, reading only the
+        # pages that hold them
+        return self.entries[self.career_entry_indices_of(career)]
+
+    def string_table(self, entity):
+        """"""
+        # The string table of the character or guild ids is only read on first use. KeyError if the scoreboards were
+        # built without them
+        if entity not in self.string_tables:
+            table_path = os.path.join(self.memmap_dir, f'table_{entity}_id.npy')
+            if not os.path.exists(table_path):
+                raise KeyError(entity)
+            self.string_tables[entity] = StringTable.from_array(np.load(table_path))
+        return self.string_tables[entity]
+
+    def entity_name(self, entity, entity_code):
+        """"""
+        return str(np.load(os.path.join(self.memmap_dir, f'table_{entity}_name.npy'), mmap_mode='r')[entity_code])
+
+    def character_entries(self, character_id):
+        """"""
+        # All entries of a character, found by comparing the character codes of the entries to its code
+        character_code = self.string_table('character').code(character_id)
+        return self.entries[np.flatnonzero(self.entries['character'] == character_code)]
+
+
+def open_scoreboard_memmap(statistics_path, scoreboard_memmap_outdir=SCOREBOARD_MEMMAP_DIR):
+    """"""
+    # The memory mapped scoreboards of a statistics file are (re)built whenever they are missing or older than the
+    # statistics file
+    memmap_dir = scoreboard_memmap_dir(statistics_path, scoreboard_memmap_outdir)
+    entries_path = os.path.join(memmap_dir, 'entries.npy')
+    if not os.path.exists(entries_path) or os.path.getmtime(entries_path) < os.path.getmtime(statistics_path):
+        save_scoreboard_memmap(build_scoreboard_memmap(load_columnar_scenario_statistics(statistics_path)), memmap_dir)
+    return ScoreboardMemmap(memmap_dir)
+
+
+def main():
+    """"""
+    statistics_paths = sorted(glob.glob(os.path.abspath(SUBDIVIDED_JSON_DIR) + '/scenario_statistics_*.json*'))
+    for statistics_path in tqdm(statistics_paths):
+        memmap_dir = scoreboard_memmap_dir(statistics_path)
+        save_scoreboard_memmap(build_scoreboard_memmap(load_columnar_scenario_statistics(statistics_path)), memmap_dir)
+        print(f'{os.path.basename(statistics_path)} -> {memmap_dir}')
+
+    print('fin')
+
+
+if __name__ == '__main__':
+    main()
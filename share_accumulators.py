@@ -0,0 +1,125 @@
+import numpy as np
+
+# Number of shares per career pairing that are kept as they are for an exact trimmed mean. Beyond that the shares are
+# counted and summed in a histogram of SHARE_HISTOGRAM_BINS equally wide bins over [0, 1]
+EXACT_SHARE_LIMIT = 10000
+SHARE_HISTOGRAM_BINS = 1000
+# Exact share limit of parameter sweeps, which hold the sketches of every grid point at once
+SWEEP_EXACT_SHARE_LIMIT = 1000
+
+
+class PairShareMeanAccumulator:
+    """"""
+
+    def __init__(self, career_count, metric_count):
+        """"""
+        self.pair_counts = np.zeros((career_count, career_count))
+        self.pair_share_sums = np.zeros((metric_count, career_count, career_count))
+
+    def update(self, career_present, career_shares):
+        """"""
+        # For the pairing of career x and y in all scenarios both are present in, the count of scenarios is
+        # (P.T @ P)[x, y] and the sum of the shares of career x is (S.T @ P)[x, y], given the scenario x career matrices
+        # of presence P and shares S
+        present = career_present.astype(np.float64)
+        self.pair_counts += present.T @ present
+        self.pair_share_sums += np.matmul(career_shares.transpose(0, 2, 1), present)
+
+    def pair_count(self, x, y):
+        """"""
+        return int(self.pair_counts[x, y])
+
+    def mean_shares(self, x, y):
+        """"""
+        # Mean share of career x of each metric when paired with career y, None if they were never paired
+        pair_count = self.pair_count(x, y)
+        if not pair_count:
+            return [None] * len(self.pair_share_sums)
+        return [float(share_sum) / pair_count for share_sum in self.pair_share_sums[:, x, y]]
+
+
+class TrimmedMeanSketch:
+    """"""
+
+    def __init__(self, metric_count, exact_limit=EXACT_SHARE_LIMIT, histogram_bins=SHARE_HISTOGRAM_BINS):
+        """"""
+        self.metric_count = metric_count
+        self.exact_limit = exact_limit
+        self.histogram_bins = histogram_bins
+        self.count = 0
+        self.exact_shares = list()
+        self.bin_counts = None
+        self.bin_sums = None
+
+    def add(self, shares):
+        """"""
+        # Shares is a metrics x values array
+        self.count += shares.shape[1]
+        if self.bin_counts is None:
+            self.exact_shares.append(shares)
+            if self.count <= self.exact_limit:
+                return
+            shares = np.concatenate(self.exact_shares, axis=1)
+            self.exact_shares = list()
+            self.bin_counts = np.zeros((self.metric_count, self.histogram_bins), dtype=np.int64)
+            self.bin_sums = np.zeros((self.metric_count, self.histogram_bins))
+
+        bin_indices = np.clip((shares * self.histogram_bins).astype(np.int64), 0, self.histogram_bins - 1)
+        for metric_index in range(self.metric_count):
+            self.bin_counts[metric_index] += np.bincount(bin_indices[metric_index], minlength=self.histogram_bins)
+            self.bin_sums[metric_index] += np.bincount(bin_indices[metric_index], weights=shares[metric_index],
+                                                       minlength=self.histogram_bins)
+
+    def trimmed_means(self, disregard_worst_performances):
+        """"""
+        # Mean of each metric's shares without the lowest disregard_worst_performances fraction of them
+        disregarded_count = int(self.count * disregard_worst_performances)
+        if self.count - disregarded_count <= 0:
+            return [None] * self.metric_count
+
+        if self.bin_counts is None:
+            shares = np.concatenate(self.exact_shares, axis=1)
+            return [float(np.sort(metric_shares)[disregarded_count:].mean()) for metric_shares in shares]
+
+        # Whole bins are disregarded from the bottom up. Of the bin the cutoff falls into, the disregarded shares are
+        # assumed to be of the bin's mean share, which is off by at most the bin width
+        trimmed_means = list()
+        for bin_counts, bin_sums in zip(self.bin_counts, self.bin_sums):
+            cumulative_counts = np.cumsum(bin_counts)
+            cutoff_bin = int(np.searchsorted(cumulative_counts, disregarded_count, side='right'))
+            disregarded_sum = float(bin_sums[:cutoff_bin].sum())
+            if cutoff_bin < len(bin_counts):
+                partially_disregarded = disregarded_count - int(cumulative_counts[cutoff_bin - 1] if cutoff_bin else 0)
+                if partially_disregarded:
+                    disregarded_sum += float(partially_disregarded * bin_sums[cutoff_bin] / bin_counts[cutoff_bin])
+            # Plain floats, as the means end up in the JSON of cached results
+            trimmed_means.append((float(bin_sums.sum()) - disregarded_sum) / (self.count - disregarded_count))
+        return trimmed_means
+
+
+class PairShareTrimmedMeanAccumulator:
+    """"""
+
+    def __init__(self, career_count, metric_count, exact_limit=EXACT_SHARE_LIMIT, histogram_bins=SHARE_HISTOGRAM_BINS,
+                 pairs=None):
+        """"""
+        # Only the given (x, y) pairings are sketched, all of them if None
+        if pairs is None:
+            pairs = [(x, y) for x in range(career_count) for y in range(career_count) if x != y]
+        self.pair_sketches = {(x, y): TrimmedMeanSketch(metric_count, exact_limit, histogram_bins) for x, y in pairs}
+
+    def update(self, career_present, career_shares):
+        """"""
+        for (x, y), pair_sketch in self.pair_sketches.items():
+            paired = career_present[:, x] & career_present[:, y]
+            if paired.any():
+                pair_sketch.add(career_shares[:, paired, x])
+
+    def pair_count(self, x, y):
+        """"""
+        return self.pair_sketches[(x, y)].count
+
+    def mean_shares(self, x, y, disregard_worst_performances):
+        """"""
+        return self.pair_sketches[(x, y)].trimmed_means(disregard_worst_performances)
+
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Code of a missing string, e.g. of the guild of a character without guild
+NO_CODE = -1
+
+
+class StringTable:
+    """"""
+
+    def __init__(self, strings=()):
+        """"""
+        # Strings are coded in the order they are first interned, so that the code of a string is its index in strings
+        self.strings = list()
+        self.string_codes = dict()
+        for string in strings:
+            self.intern(string)
+
+    def __len__(self):
+        """"""
+        return len(self.strings)
+
+    def __contains__(self, string):
+        """"""
+        return string in self.string_codes
+
+    def __getitem__(self, code):
+        """"""
+        return self.strings[code]
+
+    def intern(self, string):
+        """"""
+        string_code = self.string_codes.get(string)
+        if string_code is None:
+            string_code = self.string_codes[string] = len(self.strings)
+            self.strings.append(string)
+        return string_code
+
+    def code(self, string):
+        """"""
+        return self.string_codes[string]
+
+    def encode(self, strings, dtype=np.int32):
+        """"""
+        return np.array([self.string_codes[string] for string in strings], dtype=dtype)
+
+    def positions(self, strings):
+        """"""
+        # Lookup array of the position of a code in the strings, or NO_CODE if it is not one of them
+        string_positions = np.full(len(self.strings), NO_CODE, dtype=np.int64)
+        string_positions[[self.string_codes[string] for string in strings]] = np.arange(len(strings))
+        return string_positions
+
+    def to_array(self):
+        """"""
+        return np.array(self.strings, dtype=str)
+
+    @classmethod
+    def from_array(cls, strings_array):
+        """"""
+        return cls(strings_array.tolist())
@@ -1,68 +1,106 @@
 import os
-import json
 from tqdm import tqdm
 from statistics import mean
+from contextlib import ExitStack
+from scenario_statistics_stream import open_json_records_writer, iter_scenario_statistics, find_json_records_path, \
+    require_json_records_path
+from scenario_records import ScenarioRecordParser
+from scenario_realm_aggregates import ScenarioRealmAggregator, realm_aggregates_path
 
-SCENARIO_STATISTICS_JSON_FILE = './ror-killboard_scenario_statistics.json'
+SCENARIO_STATISTICS_JSON_FILE = './ror-killboard_scenario_statistics.jsonl.gz'
 SUBDIVIDED_JSON_OUTPUT_DIR = './subdivided_scenario_statistics/'
+PARTITION_NAMES = ['t1_standard', 't1_pug', 'mid-tier_standard', 'mid-tier_pug', 't4_standard', 't4_pug', 't4_city',
+                   't4_group-ranked']
+# Partitions are written as gzip compressed JSON lines, partitions in any of the other formats are read just as well
+PARTITION_FILE_EXTENSION = '.jsonl.gz'
+
+
+def partition_json_path(partition_name, subdivided_json_outdir=SUBDIVIDED_JSON_OUTPUT_DIR,
+                        partition_file_extension=PARTITION_FILE_EXTENSION):
+    """"""
+    return os.path.abspath(subdivided_json_outdir) + f'/scenario_statistics_{partition_name}{partition_file_extension}'
+
+
+def temp_partition_path(partition_path):
+    """"""
+    # Same extensions as the partition, so that it is written in the same format
+    partition_dir, partition_filename = os.path.split(partition_path)
+    return os.path.join(partition_dir, f'tmp_{partition_filename}')
+
+
+def find_partition_path(partition_name, subdivided_json_outdir=SUBDIVIDED_JSON_OUTPUT_DIR):
+    """"""
+    # The existing file of a partition, of whichever format it was written in, None if it was not subdivided
+    return find_json_records_path(partition_json_path(partition_name, subdivided_json_outdir))
+
+
+def require_partition_path(partition_name, subdivided_json_outdir=SUBDIVIDED_JSON_OUTPUT_DIR):
+    """"""
+    return require_json_records_path(partition_json_path(partition_name, subdivided_json_outdir))
+
+
+def classify_scenario(scenario):
+    """"""
+    scenario_type = scenario.queueType.lower()
+    if scenario_type == 'duo':
+        scenario_type = 'pug'
+
+    if scenario_type == 'city':
+        return 't4_city'
+    if scenario_type == 'group_ranked':
+        return 't4_group-ranked'
+
+    character_levels = [entry.level for entry in scenario.scoreboardEntries]
+    mean_character_level = round(mean(character_levels))
+
+    if mean_character_level < 16:
+        return f't1_{scenario_type}'
+    elif mean_character_level < 40:
+        return f'mid-tier_{scenario_type}'
+    else:
+        return f't4_{scenario_type}'
 
 
 def main():
     """"""
+    # The statistics are looked for in all formats before any partition file is truncated
+    statistics_path = require_json_records_path(SCENARIO_STATISTICS_JSON_FILE)
     subdivided_json_outdir = os.path.abspath(SUBDIVIDED_JSON_OUTPUT_DIR)
     os.makedirs(subdivided_json_outdir, exist_ok=True)
 
-    t1_standard_json_path = subdivided_json_outdir + '/scenario_statistics_t1_standard.json'
-    t1_pug_json_path = subdivided_json_outdir + '/scenario_statistics_t1_pug.json'
-    mid_tier_standard_json_path = subdivided_json_outdir + '/scenario_statistics_mid-tier_standard.json'
-    mid_tier_pug_json_path = subdivided_json_outdir + '/scenario_statistics_mid-tier_pug.json'
-    t4_standard_json_path = subdivided_json_outdir + '/scenario_statistics_t4_standard.json'
-    t4_pug_json_path = subdivided_json_outdir + '/scenario_statistics_t4_pug.json'
-    t4_city_json_path = subdivided_json_outdir + '/scenario_statistics_t4_city.json'
-    t4_group_ranked_json_path = subdivided_json_outdir + '/scenario_statistics_t4_group-ranked.json'
-
-    with open(SCENARIO_STATISTICS_JSON_FILE, 'r') as json_file:
-        scenario_statistics = json.load(json_file)
-
-    scenario_statistics_t1 = {'standard': dict(), 'pug': dict()}
-    scenario_statistics_mid_tier = {'standard': dict(), 'pug': dict()}
-    scenario_statistics_t4 = {'standard': dict(), 'pug': dict(), 'city': dict(), 'group_ranked': dict()}
-
-    for scenario_id, scenario_info in tqdm(scenario_statistics.items()):
-        scenario_type = scenario_info['queueType'].lower()
-        if scenario_type == 'duo':
-            scenario_type = 'pug'
-
-        if scenario_type in ['city', 'group_ranked']:
-            scenario_statistics_t4[scenario_type][scenario_id] = scenario_info
-            continue
-
-        character_levels = [character_info['level'] for character_info in scenario_info['scoreboardEntries']]
-        mean_character_level = round(mean(character_levels))
-
-        if mean_character_level < 16:
-            scenario_statistics_t1[scenario_type][scenario_id] = scenario_info
-        elif mean_character_level < 40:
-            scenario_statistics_mid_tier[scenario_type][scenario_id] = scenario_info
-        else:
-            scenario_statistics_t4[scenario_type][scenario_id] = scenario_info
-
-    with open(t1_standard_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_t1['standard'], out_file)
-    with open(t1_pug_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_t1['pug'], out_file)
-    with open(mid_tier_standard_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_mid_tier['standard'], out_file)
-    with open(mid_tier_pug_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_mid_tier['pug'], out_file)
-    with open(t4_standard_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_t4['standard'], out_file)
-    with open(t4_pug_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_t4['pug'], out_file)
-    with open(t4_city_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_t4['city'], out_file)
-    with open(t4_group_ranked_json_path, 'w') as out_file:
-        json.dump(scenario_statistics_t4['group_ranked'], out_file)
+    # The scenarios are streamed from the statistics file straight into the partition files, so that only a single
+    # scenario is held in memory at any time. Each scenario is classified and aggregated from its record, but written as
+    # it was scraped. The per scenario realm aggregates of each partition are spooled on the way and stored next to the
+    # partition once it is written. The partitions are written to temporary files first, which only replace the previous
+    # partitions once all scenarios are subdivided, so that a failed run never leaves partitions that look complete
+    scenario_record_parser = ScenarioRecordParser()
+    partition_paths = {partition_name: partition_json_path(partition_name, subdivided_json_outdir)
+                       for partition_name in PARTITION_NAMES}
+    # The aggregates are saved on leaving the outer stack, i.e. after the partitions are replaced, so that they are
+    # newer than their partition and not taken as stale
+    try:
+        with ExitStack() as aggregator_stack:
+            partition_aggregators = {partition_name: aggregator_stack.enter_context(
+                                         ScenarioRealmAggregator(realm_aggregates_path(partition_path)))
+                                     for partition_name, partition_path in partition_paths.items()}
+            with ExitStack() as writer_stack:
+                partition_writers = {partition_name: writer_stack.enter_context(
+                                         open_json_records_writer(temp_partition_path(partition_path)))
+                                     for partition_name, partition_path in partition_paths.items()}
+
+                for scenario_id, scenario_info in tqdm(iter_scenario_statistics(statistics_path)):
+                    scenario = scenario_record_parser.parse(scenario_info)
+                    partition_name = classify_scenario(scenario)
+                    partition_writers[partition_name].write(scenario_id, scenario_info)
+                    partition_aggregators[partition_name].add(scenario_id, scenario)
+
+            for partition_path in partition_paths.values():
+                os.replace(temp_partition_path(partition_path), partition_path)
+    except BaseException:
+        for partition_path in partition_paths.values():
+            if os.path.exists(temp_partition_path(partition_path)):
+                os.remove(temp_partition_path(partition_path))
+        raise
 
     print('fin')
 